@@ -6,93 +6,387 @@ Professional-grade audio processing with AI-powered mixing decisions
 
 import os
 import time
-import json
+import math
+import wave
+import subprocess
+import threading
+import orjson
+import diskcache
 import numpy as np
 import logging
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
 from datetime import datetime
+from enum import IntEnum
+from types import MappingProxyType
+from functools import lru_cache
+from scipy.signal import butter, lfilter, oaconvolve, sosfilt
 from pydub import AudioSegment
-from pydub.effects import normalize, compress_dynamic_range
+from pydub.effects import normalize
 from security.rados_security import log_security_event, watermark_content
-from openai import OpenAI
+
+# Internal sample rate and channel layout of the mixing bus
+MIX_FRAME_RATE = 44100
+MIX_CHANNELS = 2
+
+# Persistent AI recommendations keyed on (track_type, mixing_style)
+AI_RECOMMENDATION_CACHE = diskcache.Cache('logs/audio/ai_cache')
+AI_RECOMMENDATION_TTL = 86400
+
+# Shared 30 second placeholder; AudioSegment operations return new segments, so it is never mutated
+SILENCE_30S = AudioSegment.silent(duration=30000, frame_rate=MIX_FRAME_RATE)
+
+class FilterKind(IntEnum):
+    """Biquad shapes for the EQ designer"""
+    PEAK = 0
+    LOW_SHELF = 1
+    HIGH_SHELF = 2
+    HIGH_PASS = 3
+
+# AI EQ suggestion -> (filter kind, gain in dB)
+TRACK_EQ_BANDS = {
+    'high_pass': (FilterKind.HIGH_PASS, 0),
+    'low_cut': (FilterKind.HIGH_PASS, 0),
+    'presence_boost': (FilterKind.PEAK, 3),
+    'mid_scoop': (FilterKind.PEAK, -3),
+    'air_boost': (FilterKind.HIGH_SHELF, 2),
+    'brightness': (FilterKind.HIGH_SHELF, 2)
+}
+
+class TrackType(IntEnum):
+    """Track type codes; unknown types mix as instruments"""
+    VOCAL = 0
+    BASS = 1
+    INSTRUMENT = 2
+
+class Placement(IntEnum):
+    """Stereo placement codes; unknown placements stay centered"""
+    CENTER = 0
+    LEFT = 1
+    RIGHT = 2
+    CENTER_PROMINENT = 3
+    STEREO_WIDE = 4
+
+# Incoming string tags, mapped to codes once per track
+TRACK_TYPES = {track_type.name.lower(): track_type for track_type in TrackType}
+PLACEMENTS = {placement.name.lower(): placement for placement in Placement}
+
+# Mix gain in dB indexed by TrackType (vocals +2 dB, bass +1 dB)
+TRACK_TYPE_GAIN_DB = np.array([2.0, 1.0, 0.0], dtype=np.float32)
+
+# Pan position, gain in dB and whether the preset stereo width applies, indexed by Placement
+PLACEMENT_PAN = (0.0, -0.7, 0.7, 0.0, 0.0)
+PLACEMENT_GAIN_DB = (0, 0, 0, 2, 0)
+PLACEMENT_WIDENS = (False, False, False, False, True)
+
+# Row-vector L/R <-> Mid/Side transforms for (frames, 2) buffers
+LR_TO_MS = np.array([[0.5, 0.5], [0.5, -0.5]], dtype=np.float32)
+MS_TO_LR = np.array([[1.0, 1.0], [1.0, -1.0]], dtype=np.float32)
+
+
+@dataclass
+class TrackBuffer:
+    """Mutable float32 samples of one track while it runs through the effect chain"""
+    samples: np.ndarray  # float32 (n_frames, channels), normalized to [-1, 1]
+    frame_rate: int
+
+@dataclass
+class TrackBatch:
+    """Structure-of-arrays layout of all tracks in a mix"""
+    samples: np.ndarray   # float32 (n_tracks, n_frames, channels), normalized to [-1, 1]
+    names: list
+    types: np.ndarray     # uint8 TrackType codes
+    gains_db: np.ndarray  # float32 per-track mix gain
+    frame_rate: int
+    
+    @classmethod
+    def allocate(cls, audio_tracks, n_frames):
+        """Preallocate one silent sample block for every track in the mix"""
+        types = np.array(
+            [TRACK_TYPES.get(str(track_info.get('type')), TrackType.INSTRUMENT) for track_info in audio_tracks],
+            dtype=np.uint8
+        )
+        
+        return cls(
+            samples=np.zeros((len(audio_tracks), n_frames, MIX_CHANNELS), dtype=np.float32),
+            names=[track_info.get('name', 'Track') for track_info in audio_tracks],
+            types=types,
+            gains_db=TRACK_TYPE_GAIN_DB[types],
+            frame_rate=MIX_FRAME_RATE
+        )
+    
+    def track(self, index):
+        """In-place view of one track's samples"""
+        return TrackBuffer(self.samples[index], self.frame_rate)
+
+@lru_cache(maxsize=32)
+def placement_matrix(pan, width, gain_db):
+    """2x2 stereo matrix: Mid/Side width, equal-power pan and gain in one multiply"""
+    theta = (pan + 1) * np.pi / 4
+    pan_law = np.diag([np.cos(theta), np.sin(theta)]) * np.sqrt(2)  # unity at center
+    matrix = LR_TO_MS @ np.diag([1.0, width]) @ MS_TO_LR @ pan_law
+    matrix = (matrix * 10 ** (gain_db / 20)).astype(np.float32)
+    matrix.flags.writeable = False
+    return matrix
+
+def design_biquads(kinds, freqs, gains_db, fs, q=0.707):
+    """Design a biquad cascade from packed band arrays (RBJ audio EQ cookbook)"""
+    # Coefficients are designed in float64; low-frequency biquads are unstable in float32
+    kinds = np.asarray(kinds)
+    freqs = np.minimum(np.asarray(freqs, dtype=np.float64), 0.45 * fs)
+    a = np.power(10.0, np.asarray(gains_db, dtype=np.float64) / 40.0)
+    w0 = 2 * np.pi * freqs / fs
+    cos_w0 = np.cos(w0)
+    alpha = np.sin(w0) / (2 * q)
+    k = 2 * np.sqrt(a) * alpha
+    
+    # (numerator, denominator) for every shape, evaluated over all bands at once
+    forms = {
+        FilterKind.PEAK: (
+            [1 + alpha * a, -2 * cos_w0, 1 - alpha * a],
+            [1 + alpha / a, -2 * cos_w0, 1 - alpha / a]
+        ),
+        FilterKind.LOW_SHELF: (
+            [a * ((a + 1) - (a - 1) * cos_w0 + k), 2 * a * ((a - 1) - (a + 1) * cos_w0), a * ((a + 1) - (a - 1) * cos_w0 - k)],
+            [(a + 1) + (a - 1) * cos_w0 + k, -2 * ((a - 1) + (a + 1) * cos_w0), (a + 1) + (a - 1) * cos_w0 - k]
+        ),
+        FilterKind.HIGH_SHELF: (
+            [a * ((a + 1) + (a - 1) * cos_w0 + k), -2 * a * ((a - 1) + (a + 1) * cos_w0), a * ((a + 1) + (a - 1) * cos_w0 - k)],
+            [(a + 1) - (a - 1) * cos_w0 + k, 2 * ((a - 1) - (a + 1) * cos_w0), (a + 1) - (a - 1) * cos_w0 - k]
+        ),
+        FilterKind.HIGH_PASS: (
+            [(1 + cos_w0) / 2, -(1 + cos_w0), (1 + cos_w0) / 2],
+            [1 + alpha, -2 * cos_w0, 1 - alpha]
+        )
+    }
+    
+    sos = np.zeros((len(kinds), 6))
+    for kind, (numerator, denominator) in forms.items():
+        rows = kinds == kind
+        if rows.any():
+            sos[rows] = np.stack(numerator + denominator, axis=1)[rows]
+    
+    return sos / sos[:, 3:4]
+
+def pack_eq_curve(eq_curve):
+    """Flatten a preset EQ curve into contiguous (kinds, freqs, gains) arrays"""
+    bands = [(band, settings) for band, settings in eq_curve.items() if settings.get('gain')]
+    kinds = np.array(
+        [FilterKind[band.upper()] if band in ('low_shelf', 'high_shelf') else FilterKind.PEAK for band, _ in bands],
+        dtype=np.uint8
+    )
+    freqs = np.array([settings['freq'] for _, settings in bands], dtype=np.float32)
+    gains = np.array([settings['gain'] for _, settings in bands], dtype=np.float32)
+    return kinds, freqs, gains
+
+@lru_cache(maxsize=128)
+def _design_track_eq(bands, fs):
+    """Cached SOS design for a normalized tuple of AI EQ suggestions"""
+    kinds = np.array([TRACK_EQ_BANDS[name][0] for name, _ in bands], dtype=np.uint8)
+    freqs = np.array([freq for _, freq in bands], dtype=np.float32)
+    gains = np.array([TRACK_EQ_BANDS[name][1] for name, _ in bands], dtype=np.float32)
+    return design_biquads(kinds, freqs, gains, fs)
+
+def design_track_eq(eq_settings, fs):
+    """Build the SOS cascade for AI EQ suggestions, ignoring non-numeric values"""
+    bands = tuple(sorted(
+        (name, float(value)) for name, value in eq_settings.items()
+        if name in TRACK_EQ_BANDS and isinstance(value, (int, float))
+        and not isinstance(value, bool) and 20 <= value < fs / 2
+    ))
+    return _design_track_eq(bands, fs)
+
+def compress_samples(samples, threshold_db, ratio, fs, attack_ms=5.0, release_ms=50.0):
+    """Vectorized feed-forward compressor for float samples shaped (frames, channels)"""
+    # Stereo-linked peak detector
+    level = np.max(np.abs(samples), axis=1)
+    
+    # One-pole attack and release smoothers; their maximum follows the attack
+    # curve on rising levels and the release curve on falling ones
+    envelope = None
+    for time_ms in (attack_ms, release_ms):
+        a = 1.0 - math.exp(-1000.0 / (max(time_ms, 0.01) * fs))
+        smoothed = lfilter([a], [1.0, a - 1.0], level)
+        envelope = smoothed if envelope is None else np.maximum(envelope, smoothed)
+    
+    level_db = 20.0 * np.log10(np.maximum(envelope, 1e-9))
+    over_db = np.maximum(level_db - threshold_db, 0.0)
+    gain = np.power(10.0, over_db * (1.0 / ratio - 1.0) / 20.0)
+    
+    return (samples * gain[:, np.newaxis]).astype(np.float32)
+
+@lru_cache(maxsize=8)
+def design_band_split(fs):
+    """Low (<250 Hz) and high (>4 kHz) crossover filters for multiband processing"""
+    return (
+        butter(4, 250, btype='lowpass', fs=fs, output='sos'),
+        butter(4, 4000, btype='highpass', fs=fs, output='sos')
+    )
+
+def compress_multiband(samples, threshold_db, ratio, fs):
+    """Compress low, mid and high bands independently and sum them back"""
+    low_sos, high_sos = design_band_split(fs)
+    low = sosfilt(low_sos, samples, axis=0)
+    high = sosfilt(high_sos, samples, axis=0)
+    mid = samples - low - high  # bands sum back to the input when uncompressed
+    
+    return sum(compress_samples(band, threshold_db, ratio, fs) for band in (low, mid, high))
+
+def feedback_delay(samples, delay_samples, feedback, wet):
+    """Feedback delay line y[n] = x[n] + feedback * y[n - d], mixed in at `wet`"""
+    n_frames = len(samples)
+    delayed = samples.copy()
+    
+    # A block of d frames only depends on the previous, already final block,
+    # so the recurrence runs as n/d vectorized block updates
+    for start in range(delay_samples, n_frames, delay_samples):
+        end = min(start + delay_samples, n_frames)
+        delayed[start:end] += feedback * delayed[start - delay_samples:end - delay_samples]
+    
+    return (1.0 - wet) * samples + wet * delayed
+
+def _pcm_to_float(raw_bytes, channels):
+    """16-bit PCM bytes -> normalized (frames, channels) float32, cast and scaled in one pass"""
+    pcm = np.frombuffer(raw_bytes, dtype=np.int16).reshape(-1, channels)
+    return np.multiply(pcm, np.float32(1.0 / 32768.0), dtype=np.float32)
+
+def _float_to_pcm(samples, gain=1.0):
+    """Normalized float samples -> rounded, clipped 16-bit PCM bytes"""
+    scaled = np.multiply(samples, np.float32(32768.0 * gain), dtype=np.float32)
+    np.rint(scaled, out=scaled)
+    np.clip(scaled, -32768, 32767, out=scaled)
+    return scaled.astype(np.int16).tobytes()
+
+def write_wav(path, raw_data, frame_rate, channels, sample_width):
+    """Write raw PCM straight into a WAV container"""
+    with wave.open(path, 'wb') as wav_file:
+        wav_file.setnchannels(channels)
+        wav_file.setsampwidth(sample_width)
+        wav_file.setframerate(frame_rate)
+        wav_file.writeframes(raw_data)
+
+def start_mp3_encoder(path, frame_rate, channels, bitrate='320k'):
+    """Launch ffmpeg encoding raw 16-bit PCM from stdin to CBR MP3 (LAME's fast quality 5 mode)"""
+    return subprocess.Popen(
+        ['ffmpeg', '-y', '-loglevel', 'error', '-f', 's16le', '-ar', str(frame_rate), '-ac', str(channels),
+         '-i', '-', '-codec:a', 'libmp3lame', '-b:a', bitrate, '-compression_level', '5', path],
+        stdin=subprocess.PIPE
+    )
+
+def feed_encoder(encoder, raw_data):
+    """Stream PCM into the encoder and close its stdin"""
+    try:
+        with encoder.stdin:
+            encoder.stdin.write(raw_data)
+    except BrokenPipeError:
+        pass  # Encoder exited early; its return code reports the failure
+
+@lru_cache(maxsize=16)
+def build_reverb_ir(decay_time, pre_delay, fs):
+    """Synthesize a reverb impulse response: pre-delay, then exponentially decaying noise"""
+    n_tail = max(1, int(decay_time * fs))
+    t = np.arange(n_tail, dtype=np.float32) / fs
+    
+    # Envelope reaches -60 dB after decay_time seconds
+    envelope = np.power(10.0, -3.0 * t / decay_time, dtype=np.float32)
+    tail = np.random.default_rng(0).standard_normal(n_tail).astype(np.float32) * envelope
+    tail /= np.sqrt(np.sum(tail ** 2))
+    
+    ir = np.concatenate([np.zeros(int(pre_delay * fs / 1000), dtype=np.float32), tail])
+    ir.setflags(write=False)  # shared through the cache
+    return ir
 
 class AdvancedAudioMixer:
     """Professional audio mixing and mastering system with AI assistance"""
     
-    def __init__(self):
-        self.openai_client = OpenAI(api_key=os.environ.get('OPENAI_API_KEY'))
-        
-        # Professional mixing presets
-        self.mixing_presets = {
-            'cinematic_epic': {
-                'master_volume': 0.85,
-                'dynamics': {
-                    'compression_ratio': 3.5,
-                    'attack': 10,
-                    'release': 100,
-                    'threshold': -18
-                },
-                'eq_curve': {
-                    'low_shelf': {'freq': 80, 'gain': 2},
-                    'low_mid': {'freq': 250, 'gain': -1},
-                    'mid': {'freq': 1000, 'gain': 1},
-                    'high_mid': {'freq': 4000, 'gain': 2},
-                    'high_shelf': {'freq': 8000, 'gain': 1}
-                },
-                'reverb': {
-                    'type': 'hall',
-                    'wet_level': 0.25,
-                    'decay_time': 2.5,
-                    'pre_delay': 40
-                },
-                'stereo_width': 1.3
+    # Professional mixing presets, shared by every mixer instance
+    MIXING_PRESETS = MappingProxyType({
+        'cinematic_epic': {
+            'master_volume': 0.85,
+            'dynamics': {
+                'compression_ratio': 3.5,
+                'attack': 10,
+                'release': 100,
+                'threshold': -18
             },
-            'emotional_ballad': {
-                'master_volume': 0.75,
-                'dynamics': {
-                    'compression_ratio': 2.5,
-                    'attack': 5,
-                    'release': 80,
-                    'threshold': -16
-                },
-                'eq_curve': {
-                    'low_shelf': {'freq': 100, 'gain': -1},
-                    'low_mid': {'freq': 300, 'gain': 1},
-                    'mid': {'freq': 1200, 'gain': 2},
-                    'high_mid': {'freq': 5000, 'gain': 1},
-                    'high_shelf': {'freq': 10000, 'gain': 0.5}
-                },
-                'reverb': {
-                    'type': 'plate',
-                    'wet_level': 0.15,
-                    'decay_time': 1.8,
-                    'pre_delay': 25
-                },
-                'stereo_width': 1.1
+            'eq_curve': {
+                'low_shelf': {'freq': 80, 'gain': 2},
+                'low_mid': {'freq': 250, 'gain': -1},
+                'mid': {'freq': 1000, 'gain': 1},
+                'high_mid': {'freq': 4000, 'gain': 2},
+                'high_shelf': {'freq': 8000, 'gain': 1}
             },
-            'dark_atmospheric': {
-                'master_volume': 0.70,
-                'dynamics': {
-                    'compression_ratio': 4.0,
-                    'attack': 15,
-                    'release': 150,
-                    'threshold': -20
-                },
-                'eq_curve': {
-                    'low_shelf': {'freq': 60, 'gain': 3},
-                    'low_mid': {'freq': 200, 'gain': -2},
-                    'mid': {'freq': 800, 'gain': -1},
-                    'high_mid': {'freq': 3000, 'gain': -1},
-                    'high_shelf': {'freq': 6000, 'gain': -2}
-                },
-                'reverb': {
-                    'type': 'chamber',
-                    'wet_level': 0.35,
-                    'decay_time': 3.2,
-                    'pre_delay': 60
-                },
-                'stereo_width': 1.5
-            }
+            'reverb': {
+                'type': 'hall',
+                'wet_level': 0.25,
+                'decay_time': 2.5,
+                'pre_delay': 40
+            },
+            'stereo_width': 1.3
+        },
+        'emotional_ballad': {
+            'master_volume': 0.75,
+            'dynamics': {
+                'compression_ratio': 2.5,
+                'attack': 5,
+                'release': 80,
+                'threshold': -16
+            },
+            'eq_curve': {
+                'low_shelf': {'freq': 100, 'gain': -1},
+                'low_mid': {'freq': 300, 'gain': 1},
+                'mid': {'freq': 1200, 'gain': 2},
+                'high_mid': {'freq': 5000, 'gain': 1},
+                'high_shelf': {'freq': 10000, 'gain': 0.5}
+            },
+            'reverb': {
+                'type': 'plate',
+                'wet_level': 0.15,
+                'decay_time': 1.8,
+                'pre_delay': 25
+            },
+            'stereo_width': 1.1
+        },
+        'dark_atmospheric': {
+            'master_volume': 0.70,
+            'dynamics': {
+                'compression_ratio': 4.0,
+                'attack': 15,
+                'release': 150,
+                'threshold': -20
+            },
+            'eq_curve': {
+                'low_shelf': {'freq': 60, 'gain': 3},
+                'low_mid': {'freq': 200, 'gain': -2},
+                'mid': {'freq': 800, 'gain': -1},
+                'high_mid': {'freq': 3000, 'gain': -1},
+                'high_shelf': {'freq': 6000, 'gain': -2}
+            },
+            'reverb': {
+                'type': 'chamber',
+                'wet_level': 0.35,
+                'decay_time': 3.2,
+                'pre_delay': 60
+            },
+            'stereo_width': 1.5
+        }
+    })
+    
+    # Values derived from each preset, computed once at import
+    PRESET_DERIVED = MappingProxyType({
+        name: {
+            'master_gain': np.float32(preset['master_volume']),
+            'eq_sos': design_biquads(*pack_eq_curve(preset['eq_curve']), MIX_FRAME_RATE),
+            'reverb_ir': build_reverb_ir(
+                preset['reverb']['decay_time'], preset['reverb']['pre_delay'], MIX_FRAME_RATE
+            )
         }
+        for name, preset in MIXING_PRESETS.items()
+    })
+    
+    def __init__(self):
+        # Created on first AI request; see openai_client
+        self._openai_client = None
         
         # AI mixing intelligence
         self.ai_mixing_models = {
@@ -103,11 +397,27 @@ class AdvancedAudioMixer:
             'mastering_chain': True
         }
         
+        # Guards mix session state shared by track worker threads
+        self.session_lock = threading.Lock()
+        
         # Ensure directories exist
         os.makedirs('static/mixing', exist_ok=True)
         os.makedirs('static/mastering', exist_ok=True)
         os.makedirs('logs/audio', exist_ok=True)
     
+    @property
+    def openai_client(self):
+        """OpenAI client, imported and constructed only when the AI path runs"""
+        if self._openai_client is None:
+            api_key = os.environ.get('OPENAI_API_KEY')
+            if not api_key:
+                raise RuntimeError("OPENAI_API_KEY is not set")
+            
+            from openai import OpenAI
+            self._openai_client = OpenAI(api_key=api_key)
+        
+        return self._openai_client
+    
     def create_professional_mix(self, audio_tracks, mixing_style='cinematic_epic'):
         """Create professional mix with AI-powered decisions"""
         try:
@@ -115,10 +425,10 @@ class AdvancedAudioMixer:
             print("🎛️ Starting advanced audio mixing process...")
             
             # Load mixing preset
-            preset = self.mixing_presets.get(mixing_style, self.mixing_presets['cinematic_epic'])
+            preset = self.MIXING_PRESETS.get(mixing_style, self.MIXING_PRESETS['cinematic_epic'])
             
             # Analyze tracks with AI
-            track_analysis = self.ai_analyze_tracks(audio_tracks)
+            track_analysis = self.ai_analyze_tracks(audio_tracks, mixing_style)
             
             # Create mix sessions
             mix_session = {
@@ -131,21 +441,28 @@ class AdvancedAudioMixer:
                 'created_at': datetime.utcnow().isoformat()
             }
             
-            # Process each track
-            processed_tracks = []
-            for i, track_info in enumerate(audio_tracks):
-                print(f"🎵 Processing track {i+1}: {track_info.get('name', 'Unknown')}")
-                
-                processed_track = self.process_individual_track(
-                    track_info, 
-                    track_analysis[i], 
-                    preset,
-                    mix_session
-                )
-                processed_tracks.append(processed_track)
+            # Every track's samples live in one preallocated batch (30 second placeholders for now)
+            track_batch = TrackBatch.allocate(audio_tracks, int(SILENCE_30S.frame_count()))
+            
+            # Process tracks in parallel, each in place on its own batch row;
+            # the DSP and HTTP work releases the GIL
+            with ThreadPoolExecutor(max_workers=max(1, min(8, len(audio_tracks)))) as executor:
+                futures = []
+                for i, track_info in enumerate(audio_tracks):
+                    print(f"🎵 Processing track {i+1}: {track_info.get('name', 'Unknown')}")
+                    
+                    futures.append(executor.submit(
+                        self.process_individual_track,
+                        track_batch.track(i),
+                        track_info,
+                        track_analysis[i],
+                        preset,
+                        mix_session
+                    ))
+                processed_tracks = [future.result() for future in futures]
             
             # Create final mix
-            final_mix = self.create_final_mix(processed_tracks, preset, mix_session)
+            final_mix = self.create_final_mix(track_batch, preset, mix_session)
             
             # Apply mastering chain
             mastered_audio = self.apply_mastering_chain(final_mix, mixing_style)
@@ -153,12 +470,20 @@ class AdvancedAudioMixer:
             # Export final mix
             timestamp = int(time.time())
             mix_file = f"static/mixing/professional_mix_{mixing_style}_{timestamp}.mp3"
-            mastered_audio.export(mix_file, format="mp3", bitrate="320k")
+            mastered_audio = mastered_audio.set_sample_width(2)
+            encoder = start_mp3_encoder(mix_file, mastered_audio.frame_rate, mastered_audio.channels)
+            feeder = threading.Thread(target=feed_encoder, args=(encoder, mastered_audio.raw_data))
+            feeder.start()
             
-            # Save mix session data
+            # Save mix session data while the encoder runs
             session_file = f"static/mixing/session_{mix_session['id']}.json"
-            with open(session_file, 'w') as f:
-                json.dump(mix_session, f, indent=2, default=str)
+            with open(session_file, 'wb') as f:
+                # Session fields are plain JSON types from creation on, so no fallback encoder is needed
+                f.write(orjson.dumps(mix_session, option=orjson.OPT_INDENT_2))
+            
+            feeder.join()
+            if encoder.wait() != 0:
+                raise RuntimeError(f"MP3 encoding failed with exit code {encoder.returncode}")
             
             # Add watermark protection
             watermark_content("PROFESSIONAL_MIX", mix_file)
@@ -178,14 +503,18 @@ class AdvancedAudioMixer:
             log_security_event("ADVANCED_MIXING_ERROR", str(e), "ERROR")
             raise e
     
-    def ai_analyze_tracks(self, audio_tracks):
+    def ai_analyze_tracks(self, audio_tracks, mixing_style='cinematic_epic'):
         """Use AI to analyze audio tracks for optimal mixing"""
         try:
             print("🤖 Analyzing tracks with AI...")
             
             analysis_results = []
             
-            for track_info in audio_tracks:
+            # One AI request covers every track
+            track_types = [track_info.get('type', 'instrument') for track_info in audio_tracks]
+            recommendations = self.get_ai_mixing_recommendations(track_types, mixing_style)
+            
+            for track_info, ai_recommendations in zip(audio_tracks, recommendations):
                 # Simulate advanced audio analysis
                 track_analysis = {
                     'name': track_info.get('name', 'Unknown'),
@@ -193,7 +522,7 @@ class AdvancedAudioMixer:
                     'frequency_profile': self.analyze_frequency_content(track_info),
                     'dynamic_range': self.analyze_dynamics(track_info),
                     'spectral_characteristics': self.analyze_spectrum(track_info),
-                    'ai_recommendations': self.get_ai_mixing_recommendations(track_info)
+                    'ai_recommendations': ai_recommendations
                 }
                 
                 analysis_results.append(track_analysis)
@@ -235,39 +564,62 @@ class AdvancedAudioMixer:
             'noise_floor': -45
         }
     
-    def get_ai_mixing_recommendations(self, track_info):
-        """Get AI-powered mixing recommendations"""
-        try:
-            track_type = track_info.get('type', 'instrument')
-            
-            # the newest OpenAI model is "gpt-4o" which was released May 13, 2024. 
-            # do not change this unless explicitly requested by the user
-            response = self.openai_client.chat.completions.create(
-                model="gpt-4o",
-                messages=[
-                    {
-                        "role": "system",
-                        "content": "You are a professional audio engineer and mixing expert. "
-                                   "Provide specific mixing recommendations for audio tracks. "
-                                   "Focus on EQ settings, compression, effects, and placement in mix. "
-                                   "Respond with JSON containing: eq_suggestions, compression_settings, "
-                                   "effects_chain, and mix_placement."
-                    },
-                    {
-                        "role": "user",
-                        "content": f"Provide mixing recommendations for a {track_type} track "
-                                   f"in an epic cinematic composition."
-                    }
-                ],
-                response_format={"type": "json_object"}
-            )
-            
-            ai_recommendations = json.loads(response.choices[0].message.content)
-            return ai_recommendations
-            
-        except Exception as e:
-            logging.warning(f"AI mixing recommendations failed: {e}")
-            return self.get_fallback_recommendations(track_info.get('type', 'instrument'))
+    def get_ai_mixing_recommendations(self, track_types, mixing_style='cinematic_epic'):
+        """Get AI-powered mixing recommendations, one per track type"""
+        by_type = {}
+        for track_type in set(track_types):
+            cached = AI_RECOMMENDATION_CACHE.get((track_type, mixing_style))
+            if cached is not None:
+                by_type[track_type] = cached
+        
+        # Only the track types missing from the cache go to the API
+        missing = tuple(sorted(set(track_types) - by_type.keys()))
+        if missing:
+            try:
+                fetched = self.fetch_ai_recommendations(missing, mixing_style)
+                for track_type, recommendation in fetched.items():
+                    AI_RECOMMENDATION_CACHE.set((track_type, mixing_style), recommendation,
+                                                expire=AI_RECOMMENDATION_TTL)
+                by_type.update(fetched)
+            except Exception as e:
+                logging.warning(f"AI mixing recommendations failed: {e}")
+        
+        return [by_type.get(track_type) or self.get_fallback_recommendations(track_type)
+                for track_type in track_types]
+    
+    def fetch_ai_recommendations(self, track_types, mixing_style):
+        """Request recommendations for all track types in a single completion"""
+        track_list = "\n".join(f"{i + 1}. {track_type}" for i, track_type in enumerate(track_types))
+        
+        # the newest OpenAI model is "gpt-4o" which was released May 13, 2024. 
+        # do not change this unless explicitly requested by the user
+        response = self.openai_client.chat.completions.create(
+            model="gpt-4o",
+            messages=[
+                {
+                    "role": "system",
+                    "content": "You are a professional audio engineer and mixing expert. "
+                               "Provide specific mixing recommendations for audio tracks. "
+                               "Focus on EQ settings, compression, effects, and placement in mix. "
+                               "Return a JSON object {\"recommendations\": [...]} with one entry per "
+                               "input track, in order. Each entry contains: eq_suggestions, "
+                               "compression_settings, effects_chain, and mix_placement."
+                },
+                {
+                    "role": "user",
+                    "content": f"Provide mixing recommendations for these tracks "
+                               f"in a {mixing_style.replace('_', ' ')} composition:\n{track_list}"
+                }
+            ],
+            response_format={"type": "json_object"}
+        )
+        
+        recommendations = orjson.loads(response.choices[0].message.content).get('recommendations', [])
+        return {
+            track_type: recommendation
+            for track_type, recommendation in zip(track_types, recommendations)
+            if isinstance(recommendation, dict)
+        }
     
     def get_fallback_recommendations(self, track_type):
         """Fallback mixing recommendations"""
@@ -287,178 +639,160 @@ class AdvancedAudioMixer:
         }
         return recommendations.get(track_type, recommendations['instrument'])
     
-    def process_individual_track(self, track_info, analysis, preset, mix_session):
-        """Process individual track with AI-guided decisions"""
+    def process_individual_track(self, track, track_info, analysis, preset, mix_session):
+        """Process individual track in place with AI-guided decisions"""
         try:
             print(f"🎚️ Processing: {track_info.get('name', 'Track')}")
             
-            # Load audio (simulated for now)
-            audio = AudioSegment.silent(duration=30000)  # 30 seconds placeholder
-            
+            # Audio is simulated for now: the batch row starts out silent
             processing_chain = []
             
             # Apply AI-recommended EQ
             eq_settings = analysis.get('ai_recommendations', {}).get('eq_suggestions', {})
-            audio = self.apply_intelligent_eq(audio, eq_settings)
+            derived = self.PRESET_DERIVED.get(mix_session['style'], self.PRESET_DERIVED['cinematic_epic'])
+            self.apply_intelligent_eq(track, eq_settings, derived['eq_sos'])
             processing_chain.append({'step': 'eq', 'settings': eq_settings})
             
             # Apply dynamic compression
             comp_settings = analysis.get('ai_recommendations', {}).get('compression_settings', {})
-            audio = self.apply_intelligent_compression(audio, comp_settings)
+            self.apply_intelligent_compression(track, comp_settings)
             processing_chain.append({'step': 'compression', 'settings': comp_settings})
             
             # Apply effects chain
             effects = analysis.get('ai_recommendations', {}).get('effects_chain', [])
             for effect in effects:
                 if effect == 'reverb':
-                    audio = self.apply_reverb(audio, preset['reverb'])
+                    self.apply_reverb(track, preset['reverb'], derived['reverb_ir'])
                     processing_chain.append({'step': 'reverb', 'settings': preset['reverb']})
                 elif effect == 'delay':
-                    audio = self.apply_delay(audio)
+                    self.apply_delay(track)
                     processing_chain.append({'step': 'delay'})
             
             # Apply stereo positioning
             placement = analysis.get('ai_recommendations', {}).get('mix_placement', 'center')
-            audio = self.apply_stereo_placement(audio, placement)
+            self.apply_stereo_placement(track, placement, preset.get('stereo_width', 1.0))
             processing_chain.append({'step': 'stereo_placement', 'placement': placement})
             
-            mix_session['processing_steps'].append({
-                'track': track_info.get('name', 'Unknown'),
-                'chain': processing_chain
-            })
+            with self.session_lock:
+                mix_session['processing_steps'].append({
+                    'track': track_info.get('name', 'Unknown'),
+                    'chain': processing_chain
+                })
             
             return {
-                'audio': audio,
                 'name': track_info.get('name', 'Track'),
-                'type': track_info.get('type', 'instrument'),
                 'processing': processing_chain
             }
             
         except Exception as e:
             logging.error(f"Track processing failed: {e}")
-            # Return basic processed track
+            # Fall back to a silent track
+            track.samples[:] = 0
             return {
-                'audio': AudioSegment.silent(duration=30000),
                 'name': track_info.get('name', 'Track'),
-                'type': track_info.get('type', 'instrument'),
                 'processing': ['basic_processing']
             }
     
-    def apply_intelligent_eq(self, audio, eq_settings):
+    def apply_intelligent_eq(self, track, eq_settings, preset_sos=None):
         """Apply intelligent EQ based on AI analysis"""
         try:
-            # Simulate EQ processing (would use advanced audio processing libraries)
-            processed = audio
+            # Preset curve followed by the track-specific corrections, as one cascade
+            sos = design_track_eq(eq_settings, track.frame_rate)
+            if preset_sos is not None:
+                sos = np.vstack([preset_sos, sos])
             
-            if eq_settings.get('high_pass'):
-                # Simulate high-pass filter
-                processed = processed.apply_gain(-1 if eq_settings['high_pass'] > 100 else 0)
-            
-            if eq_settings.get('presence_boost'):
-                # Simulate presence boost
-                processed = processed + 1
-            
-            return processed
+            if len(sos):
+                track.samples[:] = sosfilt(sos, track.samples, axis=0)
             
         except Exception as e:
             logging.warning(f"EQ processing failed: {e}")
-            return audio
     
-    def apply_intelligent_compression(self, audio, comp_settings):
+    def apply_intelligent_compression(self, track, comp_settings):
         """Apply intelligent compression with AI-optimized settings"""
         try:
-            # Use pydub's built-in compression
-            ratio = comp_settings.get('ratio', 3)
+            ratio = float(comp_settings.get('ratio', 3))
             
             if ratio > 1:
-                compressed = compress_dynamic_range(audio, threshold=-18.0, ratio=ratio)
-                return compressed
-            
-            return audio
+                attack = float(comp_settings.get('attack', 5))
+                release = float(comp_settings.get('release', 50))
+                track.samples[:] = compress_samples(track.samples, -18.0, ratio, track.frame_rate, attack, release)
             
         except Exception as e:
             logging.warning(f"Compression failed: {e}")
-            return audio
     
-    def apply_reverb(self, audio, reverb_settings):
-        """Apply reverb effect"""
+    def compress_audio(self, audio, threshold_db, ratio, attack_ms=5.0, release_ms=50.0):
+        """Run the vectorized compressor over an AudioSegment"""
+        audio = audio.set_sample_width(2)
+        samples = _pcm_to_float(audio.raw_data, audio.channels)
+        compressed = compress_samples(samples, threshold_db, ratio, audio.frame_rate, attack_ms, release_ms)
+        
+        return audio._spawn(_float_to_pcm(compressed))
+    
+    def apply_reverb(self, track, reverb_settings, reverb_ir=None):
+        """Apply convolution reverb"""
         try:
-            # Simulate reverb effect (would use convolution reverb in production)
             wet_level = reverb_settings.get('wet_level', 0.2)
             
             if wet_level > 0:
-                # Simple reverb simulation
-                reverb_audio = audio.apply_gain(-6)  # Quieter reverb tail
-                return audio.overlay(reverb_audio, position=100)  # 100ms delay
-            
-            return audio
+                if reverb_ir is None or track.frame_rate != MIX_FRAME_RATE:
+                    reverb_ir = build_reverb_ir(
+                        reverb_settings.get('decay_time', 2.0),
+                        reverb_settings.get('pre_delay', 0),
+                        track.frame_rate
+                    )
+                
+                # FFT overlap-add convolution, keeping the causal part only
+                wet = oaconvolve(track.samples, reverb_ir[:, np.newaxis], axes=0)[:len(track.samples)]
+                track.samples += wet_level * wet
             
         except Exception as e:
             logging.warning(f"Reverb processing failed: {e}")
-            return audio
     
-    def apply_delay(self, audio, delay_time=250, feedback=0.3, wet_level=0.15):
+    def apply_delay(self, track, delay_time=250, feedback=0.3, wet_level=0.15):
         """Apply delay effect"""
         try:
-            # Simple delay effect
-            delayed = audio.apply_gain(-6)  # Quieter delay
-            return audio.overlay(delayed, position=delay_time)
+            delay_samples = max(1, int(track.frame_rate * delay_time / 1000))
+            track.samples[:] = feedback_delay(track.samples, delay_samples, feedback, wet_level)
             
         except Exception as e:
             logging.warning(f"Delay processing failed: {e}")
-            return audio
     
-    def apply_stereo_placement(self, audio, placement):
+    def apply_stereo_placement(self, track, placement, stereo_width=1.0):
         """Apply stereo positioning"""
         try:
-            if placement == 'center':
-                return audio
-            elif placement == 'left':
-                return audio.pan(-0.7)
-            elif placement == 'right':
-                return audio.pan(0.7)
-            elif placement == 'center_prominent':
-                return audio + 2  # Boost center elements
-            elif placement == 'stereo_wide':
-                # Simulate stereo widening
-                return audio + 1
+            placement = PLACEMENTS.get(placement, Placement.CENTER)
+            width = float(stereo_width) if PLACEMENT_WIDENS[placement] else 1.0
             
-            return audio
+            matrix = placement_matrix(PLACEMENT_PAN[placement], width, PLACEMENT_GAIN_DB[placement])
+            track.samples[:] = track.samples @ matrix
             
         except Exception as e:
             logging.warning(f"Stereo placement failed: {e}")
-            return audio
     
-    def create_final_mix(self, processed_tracks, preset, mix_session):
+    def create_final_mix(self, track_batch, preset, mix_session):
         """Create final mix from processed tracks"""
         try:
             print("🎵 Creating final mix...")
             
-            # Start with silence
-            final_mix = AudioSegment.silent(duration=30000)
+            if not len(track_batch.names):
+                return SILENCE_30S
             
-            # Mix all tracks
-            for track in processed_tracks:
-                track_audio = track['audio']
-                
-                # Apply track-specific volume
-                if track['type'] == 'vocal':
-                    track_audio = track_audio + 2  # Boost vocals
-                elif track['type'] == 'bass':
-                    track_audio = track_audio + 1  # Boost bass slightly
-                
-                # Overlay onto final mix
-                final_mix = final_mix.overlay(track_audio)
-            
-            # Apply master volume
-            master_volume = preset.get('master_volume', 0.8)
-            final_mix = final_mix.apply_gain(20 * np.log10(master_volume))
+            # Single gain-weighted reduction over the track axis
+            linear_gains = np.power(10.0, track_batch.gains_db / 20.0, dtype=np.float32)
+            final_mix = np.tensordot(linear_gains, track_batch.samples, axes=1)
             
-            return final_mix
+            # Master volume is folded into the PCM conversion
+            derived = self.PRESET_DERIVED.get(mix_session['style'], self.PRESET_DERIVED['cinematic_epic'])
+            return AudioSegment(
+                data=_float_to_pcm(final_mix, derived['master_gain']),
+                sample_width=2,
+                frame_rate=track_batch.frame_rate,
+                channels=track_batch.samples.shape[2]
+            )
             
         except Exception as e:
             logging.error(f"Final mix creation failed: {e}")
-            return AudioSegment.silent(duration=30000)
+            return SILENCE_30S
     
     def apply_mastering_chain(self, audio, style):
         """Apply professional mastering chain"""
@@ -491,11 +825,16 @@ class AdvancedAudioMixer:
     def apply_multiband_compression(self, audio, style):
         """Apply multiband compression"""
         try:
-            # Simulate multiband compression
             if style in ['cinematic_epic', 'dark_atmospheric']:
-                return compress_dynamic_range(audio, threshold=-16.0, ratio=2.5)
+                threshold, ratio = -16.0, 2.5
             else:
-                return compress_dynamic_range(audio, threshold=-14.0, ratio=2.0)
+                threshold, ratio = -14.0, 2.0
+            
+            audio = audio.set_sample_width(2)
+            samples = _pcm_to_float(audio.raw_data, audio.channels)
+            compressed = compress_multiband(samples, threshold, ratio, audio.frame_rate)
+            
+            return audio._spawn(_float_to_pcm(compressed))
         except:
             return audio
     
@@ -524,7 +863,7 @@ class AdvancedAudioMixer:
         """Apply master limiter for broadcast-ready sound"""
         try:
             # Final limiting to prevent clipping
-            return compress_dynamic_range(audio, threshold=-2.0, ratio=10.0)
+            return self.compress_audio(audio, -2.0, 10.0, attack_ms=1.0, release_ms=50.0)
         except:
             return audio
     
@@ -558,7 +897,7 @@ class AdvancedAudioMixer:
             logging.error(f"Analysis report generation failed: {e}")
             return {}
     
-    def export_mix_stems(self, processed_tracks, session_id):
+    def export_mix_stems(self, track_batch, session_id):
         """Export individual track stems for further editing"""
         try:
             print("📁 Exporting mix stems...")
@@ -566,12 +905,27 @@ class AdvancedAudioMixer:
             stems_dir = f"static/mixing/stems_{session_id}"
             os.makedirs(stems_dir, exist_ok=True)
             
-            stem_files = []
-            
-            for i, track in enumerate(processed_tracks):
-                stem_file = f"{stems_dir}/stem_{i+1}_{track['name']}.wav"
-                track['audio'].export(stem_file, format="wav")
-                stem_files.append(stem_file)
+            stem_files = [
+                f"{stems_dir}/stem_{i+1}_{name}.wav"
+                for i, name in enumerate(track_batch.names)
+            ]
+            
+            # Write 16-bit PCM straight from the batch rows, concurrently
+            channels = track_batch.samples.shape[2]
+            with ThreadPoolExecutor(max_workers=max(1, min(8, len(stem_files)))) as executor:
+                futures = [
+                    executor.submit(
+                        write_wav,
+                        stem_file,
+                        _float_to_pcm(samples),
+                        track_batch.frame_rate,
+                        channels,
+                        2
+                    )
+                    for stem_file, samples in zip(stem_files, track_batch.samples)
+                ]
+                for future in futures:
+                    future.result()
             
             return stem_files
             
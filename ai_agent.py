@@ -5,14 +5,25 @@ Self-learning AI that improves with each generation
 Protected by RADOS Quantum Enforcement Policy v2.7
 © 2025 Ervin Remus Radosavlevici
 """
-import json
+import atexit
+import orjson
+import diskcache
 import os
+import re
 import logging
 import time
-import random
+import hashlib
+import tempfile
+import io
 import numpy as np
-from datetime import datetime
+from scipy.signal import resample_poly
+from collections import OrderedDict, deque
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
+from functools import lru_cache
 from security.rados_security import log_security_event
+from advanced_audio_mixer import start_mp3_encoder, feed_encoder
+from ai_services import AIServices
 from models import Generation
 from app import db
 try:
@@ -21,15 +32,155 @@ try:
 except ImportError:
     HAS_SOUNDFILE = False
     print("Warning: soundfile not available - audio features limited")
+try:
+    from numba import njit, prange
+    HAS_NUMBA = True
+except ImportError:
+    HAS_NUMBA = False
+    logging.warning("numba not available - background music uses the NumPy synthesizer")
 from pydub import AudioSegment
 from gtts import gTTS
 
+# Background music is synthesized in rows of this many samples
+SYNTH_BLOCK = 65536
+SYNTH_RAMP = np.arange(SYNTH_BLOCK, dtype=np.float32)
+
+# Generous gTTS speaking-time estimate, so music synthesized alongside the voice covers it
+VOICE_MS_PER_CHAR = 80
+VOICE_MS_MARGIN = 2000
+
+# Seconds a generation statistics result is served from memory
+STATS_TTL_SECONDS = 5
+
+# Learning data is flushed after this many generations or seconds, whichever comes first
+LEARNING_FLUSH_EVERY = 10
+LEARNING_FLUSH_SECONDS = 60
+
+# Learned theme -> combination entries kept, least recently used evicted first
+LEARNED_COMBINATIONS_LIMIT = 500
+
+# Background music is only ever a bed mixed 15 dB under the voice, so 8-bit samples are enough
+MUSIC_BED_DTYPE = np.int8
+
+# Synthesized voice tracks by style and text, evicting least recently used WAVs past the size limit
+VOICE_CACHE = diskcache.Cache('logs/audio/voice_cache', size_limit=512 * 1024 * 1024,
+                              eviction_policy='least-recently-used')
+
+# Theme keyword rules in priority order. The lookahead yields a match at every position,
+# so one scan finds every rule that fires and the lowest-numbered group wins
+_VOICE_RE = re.compile(r'(?=(battle|war|champion)|(sacred|divine|eternal)|(emotional|love|heart)|(mystery|secret))')
+_VOICE_RESULTS = ('heroic_male', 'choir', 'soprano', 'whisper')
+_STYLE_RE = re.compile(r'(?=(gladiator|arena)|(sacred|prayer)|(dark|shadow)|(magic|fantasy)|(emotional)|(modern|pop))')
+_STYLE_RESULTS = ('gladiator', 'gregorian', 'dark', 'fantasy', 'emotional', 'pop')
+
+def _first_rule(pattern, text):
+    """Index of the highest-priority rule matching text, or None"""
+    rules = {match.lastindex for match in pattern.finditer(text) if match.lastindex}
+    return min(rules) - 1 if rules else None
+
+if HAS_NUMBA:
+    @njit(parallel=True, fastmath=True, cache=True)
+    def _synth(n, sample_rate, freqs, amps, powers, full_scale, out):
+        """Fused sum of sines, peak normalization and integer quantization into out"""
+        buf = np.empty(n, dtype=np.float32)
+        for i in prange(n):
+            value = 0.0
+            for j in range(freqs.shape[0]):
+                phase = (2 * np.pi * freqs[j] / sample_rate * i) % (2 * np.pi)
+                value += amps[j] * np.sin(phase) ** powers[j]
+            buf[i] = value
+        
+        peak = np.max(np.abs(buf)) if n else 0.0
+        scale = 0.7 * full_scale / peak if peak > 0 else 0.0
+        for i in prange(n):
+            out[i] = buf[i] * scale
+
+def synthesize_partials(partials, n_samples, sample_rate, dtype=np.int16):
+    """NumPy sum of (frequency, amplitude, power) partials, normalized to 70% of dtype full scale"""
+    # float32 synthesis in (blocks, SYNTH_BLOCK) rows; each row restarts its phase
+    # from a wrapped float64 offset so float32 stays accurate on long songs
+    n_blocks = max(1, -(-n_samples // SYNTH_BLOCK))
+    block_starts = np.arange(n_blocks, dtype=np.float64) * SYNTH_BLOCK
+    acc = np.zeros((n_blocks, SYNTH_BLOCK), dtype=np.float32)
+    tmp = np.empty_like(acc)
+    ramp = np.empty(SYNTH_BLOCK, dtype=np.float32)
+    
+    for frequency, amplitude, power in partials:
+        w = 2 * np.pi * frequency / sample_rate
+        row_step = w * SYNTH_BLOCK
+        if n_blocks > 2 and abs(np.sin(row_step)) > 1e-3:
+            # Row recurrence s[r] = 2cos(w*B)*s[r-1] - s[r-2]: two FLOPs per sample instead of
+            # a sin call, kept in float64 rows so rounding does not build up over the song
+            c = 2 * np.cos(row_step)
+            phase = w * np.arange(SYNTH_BLOCK, dtype=np.float64)
+            prev, cur = np.sin(phase), np.sin(phase + row_step)
+            scratch = np.empty_like(cur)
+            tmp[0], tmp[1] = prev, cur
+            for r in range(2, n_blocks):
+                np.multiply(cur, c, out=scratch)
+                np.subtract(scratch, prev, out=prev)
+                prev, cur = cur, prev
+                tmp[r] = cur
+        else:
+            # Near-degenerate row step: evaluate sin directly
+            offsets = np.mod(w * block_starts, 2 * np.pi).astype(np.float32)
+            np.multiply(SYNTH_RAMP, np.float32(w), out=ramp)
+            np.add(offsets[:, None], ramp, out=tmp)
+            np.sin(tmp, out=tmp)
+        
+        if power != 1:
+            np.power(tmp, power, out=tmp)
+        tmp *= np.float32(amplitude)
+        np.add(acc, tmp, out=acc)
+    
+    # Normalize to 70% of full scale and convert to integers in place
+    audio_array = acc.reshape(-1)[:n_samples]
+    peak = max(float(audio_array.max(initial=0.0)), -float(audio_array.min(initial=0.0)))
+    if peak > 0:
+        audio_array *= np.float32(0.7 * np.iinfo(dtype).max / peak)
+    return audio_array.astype(dtype)
+
 class InvictusAIAgent:
     """
     Advanced AI Agent with self-learning capabilities
     Improves scene selection, music style, and transitions after each generation
     """
     
+    _THEMES_LYRICS = {
+        'epic': [
+            "Rise above the shadow's call",
+            "Through the fire we stand tall",
+            "Victory echoes through the land",
+            "United we make our final stand"
+        ],
+        'battle': [
+            "Warriors gather in the dawn",
+            "Steel and courage pressing on",
+            "Glory waits beyond the fight",
+            "We are champions of the light"
+        ],
+        'sacred': [
+            "Divine light guides our way",
+            "Sacred vows we keep today",
+            "Eternal grace within our souls",
+            "Heaven's plan for us unfolds"
+        ]
+    }
+    
+    # Template verses and full text are built once; callers get copies of the verse dicts
+    _THEMES_VERSES = {
+        key: [
+            {
+                'type': 'verse' if i % 2 == 0 else 'chorus',
+                'lyrics': lyric,
+                'timing': f"{i*30}:{(i+1)*30}"
+            }
+            for i, lyric in enumerate(lyrics)
+        ]
+        for key, lyrics in _THEMES_LYRICS.items()
+    }
+    _THEMES_FULLTEXT = {key: '\n'.join(lyrics) for key, lyrics in _THEMES_LYRICS.items()}
+    
     def __init__(self):
         self.voice_styles = {
             'heroic_male': 'Deep, powerful male voice with heroic resonance',
@@ -48,9 +199,29 @@ class InvictusAIAgent:
             'emotional': 'Emotional ballad with strings and piano'
         }
         
+        # Background music partials per style as (frequency, amplitude, power)
+        self._style_partials = {
+            # Epic orchestral: C3 melody, perfect fifth, rhythmic pulse
+            'epic': ((130.81, 0.3, 1), (130.81 * 1.5, 0.2, 1), (2, 0.1, 8)),
+            # Dark, brooding: A2 melody over a sub bass
+            'dark': ((110, 0.4, 1), (110 * 0.5, 0.3, 1)),
+            # Emotional ballad: C4 melody with strings
+            'emotional': ((261.63, 0.3, 1), (261.63 * 1.25, 0.2, 1)),
+            # Everything else: G3 melody with harmony
+            'default': ((196, 0.3, 1), (196 * 1.33, 0.2, 1))
+        }
+        
         self.learning_data = self.load_learning_data()
         self.generation_count = 0
         
+        # Learning data is flushed by generation count or age (see LEARNING_FLUSH_*) and on exit
+        self._dirty = False
+        self._last_flush = time.monotonic()
+        atexit.register(self.save_learning_data)
+        
+        # Dashboard statistics are reused for a few seconds as (expires_at, stats)
+        self._stats_cache = None
+        
         # Ensure directories exist
         os.makedirs('static/audio', exist_ok=True)
         os.makedirs('static/video', exist_ok=True)
@@ -60,24 +231,51 @@ class InvictusAIAgent:
         """Load previous learning data to improve outputs"""
         try:
             if os.path.exists('logs/ai_learning.json'):
-                with open('logs/ai_learning.json', 'r') as f:
-                    return json.load(f)
+                with open('logs/ai_learning.json', 'rb') as f:
+                    learning_data = orjson.loads(f.read())
+                # Keep only the last 100 generations
+                learning_data['generation_history'] = deque(
+                    learning_data.get('generation_history', []), maxlen=100
+                )
+                
+                # Successful combinations are keyed by lowercased theme; older files store a list
+                combinations = learning_data.get('successful_combinations', {})
+                if isinstance(combinations, list):
+                    by_theme = OrderedDict()
+                    for combo in combinations:
+                        self.remember_combination(by_theme, combo)
+                    combinations = by_theme
+                learning_data['successful_combinations'] = OrderedDict(combinations)
+                
+                # Style ratings are running totals; older files store every rating
+                learning_data['style_effectiveness'] = {
+                    style: {'count': len(ratings), 'sum': sum(ratings)} if isinstance(ratings, list) else ratings
+                    for style, ratings in learning_data.get('style_effectiveness', {}).items()
+                }
+                return learning_data
         except Exception:
             pass
         
         return {
-            'successful_combinations': [],
+            'successful_combinations': OrderedDict(),
             'scene_preferences': {},
             'style_effectiveness': {},
-            'generation_history': []
+            'generation_history': deque(maxlen=100)
         }
     
     def save_learning_data(self):
         """Save learning data for future improvements"""
+        if not self._dirty:
+            return
+        
         try:
             os.makedirs('logs', exist_ok=True)
-            with open('logs/ai_learning.json', 'w') as f:
-                json.dump(self.learning_data, f, indent=2)
+            learning_data = dict(self.learning_data)
+            learning_data['generation_history'] = list(learning_data['generation_history'])
+            with open('logs/ai_learning.json', 'wb') as f:
+                f.write(orjson.dumps(learning_data, option=orjson.OPT_INDENT_2))
+            self._dirty = False
+            self._last_flush = time.monotonic()
         except Exception as e:
             log_security_event("AI_LEARNING_SAVE_ERROR", str(e), "WARNING")
     
@@ -91,20 +289,19 @@ class InvictusAIAgent:
             lyrics_data = self.generate_lyrics(theme, title)
             
             # AI analysis for optimal styles
-            voice_style = self.analyze_lyrics_for_voice(lyrics_data.get('full_text', ''), theme)
-            music_style = self.analyze_lyrics_for_style(lyrics_data.get('full_text', ''), theme)
+            voice_style = self.analyze_lyrics_for_voice(theme)
+            music_style = self.analyze_lyrics_for_style(theme)
             
-            # Create database record
+            # Create database record; it is committed once, together with the results
             generation = Generation(
                 title=title,
                 theme=theme,
                 voice_style=voice_style,
                 music_style=music_style,
-                lyrics_data=json.dumps(lyrics_data),
+                lyrics_data=orjson.dumps(lyrics_data).decode(),
                 status='generating'
             )
             db.session.add(generation)
-            db.session.commit()
             
             log_security_event("AI_GENERATION_START", 
                              f"Title: {title}, Voice: {voice_style}, Style: {music_style}")
@@ -137,7 +334,10 @@ class InvictusAIAgent:
         except Exception as e:
             log_security_event("GENERATION_ERROR", str(e), "ERROR")
             if 'generation' in locals():
+                db.session.rollback()
                 generation.status = 'failed'
+                generation.error_message = str(e)
+                db.session.add(generation)
                 db.session.commit()
             raise e
     
@@ -155,94 +355,26 @@ class InvictusAIAgent:
         return self.generate_template_lyrics(theme, title)
     
     def generate_lyrics_with_ai(self, theme, title):
-        """Generate lyrics using OpenAI"""
-        from openai import OpenAI
-        
-        client = OpenAI(api_key=os.environ.get('OPENAI_API_KEY'))
-        
-        prompt = f"""
-        Create epic cinematic lyrics for a song titled "{title}" with the theme "{theme}".
-        
-        The lyrics should be:
-        - Powerful and inspiring
-        - Suitable for orchestral/cinematic music
-        - Include verses, chorus, and bridge sections
-        - Have timing information for video synchronization
-        
-        Return as JSON:
-        {{
-            "title": "{title}",
-            "theme": "{theme}",
-            "full_text": "complete lyrics text",
-            "verses": [
-                {{
-                    "type": "verse",
-                    "lyrics": "verse lyrics here",
-                    "timing": "0:30"
-                }}
-            ]
-        }}
-        """
-        
-        response = client.chat.completions.create(
-            model="gpt-4o",
-            messages=[
-                {
-                    "role": "system",
-                    "content": "You are a professional lyricist specializing in epic, cinematic music."
-                },
-                {"role": "user", "content": prompt}
-            ],
-            response_format={"type": "json_object"}
-        )
-        
-        return json.loads(response.choices[0].message.content)
+        """Generate lyrics using OpenAI through the shared, cached lyrics service"""
+        # Failed AI requests fall back to the theme-matched templates, not the service's generic song
+        return AIServices.generate_lyrics(theme, title, fallback=self.generate_template_lyrics)
     
     def generate_template_lyrics(self, theme, title):
         """Generate template lyrics when AI is not available"""
-        themes_lyrics = {
-            'epic': [
-                "Rise above the shadow's call",
-                "Through the fire we stand tall",
-                "Victory echoes through the land",
-                "United we make our final stand"
-            ],
-            'battle': [
-                "Warriors gather in the dawn",
-                "Steel and courage pressing on",
-                "Glory waits beyond the fight",
-                "We are champions of the light"
-            ],
-            'sacred': [
-                "Divine light guides our way",
-                "Sacred vows we keep today",
-                "Eternal grace within our souls",
-                "Heaven's plan for us unfolds"
-            ]
-        }
-        
         # Select appropriate lyrics based on theme
         theme_lower = theme.lower()
         if 'battle' in theme_lower or 'war' in theme_lower:
-            selected_lyrics = themes_lyrics['battle']
+            key = 'battle'
         elif 'sacred' in theme_lower or 'divine' in theme_lower:
-            selected_lyrics = themes_lyrics['sacred']
+            key = 'sacred'
         else:
-            selected_lyrics = themes_lyrics['epic']
-        
-        verses = []
-        for i, lyric in enumerate(selected_lyrics):
-            verses.append({
-                'type': 'verse' if i % 2 == 0 else 'chorus',
-                'lyrics': lyric,
-                'timing': f"{i*30}:{(i+1)*30}"
-            })
+            key = 'epic'
         
         return {
             'title': title,
             'theme': theme,
-            'full_text': '\n'.join(selected_lyrics),
-            'verses': verses
+            'full_text': self._THEMES_FULLTEXT[key],
+            'verses': [dict(verse) for verse in self._THEMES_VERSES[key]]
         }
     
     def generate_professional_music_with_voice(self, lyrics_data, style, voice_style):
@@ -252,17 +384,29 @@ class InvictusAIAgent:
             filename = f"music_{style}_{timestamp}.mp3"
             filepath = os.path.join('static/audio', filename)
             
-            # Generate voice audio from lyrics
-            voice_audio = self.synthesize_voice(lyrics_data['full_text'], voice_style)
+            # Voice synthesis (network bound) and background music (CPU bound) run concurrently;
+            # the music is sized from a text-length estimate and trimmed to the voice afterwards
+            estimated_ms = len(lyrics_data['full_text']) * VOICE_MS_PER_CHAR + VOICE_MS_MARGIN
+            with ThreadPoolExecutor(max_workers=2) as executor:
+                voice_future = executor.submit(self.synthesize_voice, lyrics_data['full_text'], voice_style)
+                music_future = executor.submit(self.generate_background_music, style, estimated_ms)
+                voice_audio = voice_future.result()
+                music_audio = music_future.result()
             
-            # Generate background music
-            music_audio = self.generate_background_music(style, len(voice_audio))
+            if len(music_audio) < len(voice_audio):
+                music_audio = self.generate_background_music(style, len(voice_audio))
+            else:
+                music_audio = music_audio[:len(voice_audio)]
             
             # Mix voice and music
             final_audio = self.mix_audio(voice_audio, music_audio)
             
             # Export final audio
-            final_audio.export(filepath, format="mp3")
+            final_audio = final_audio.set_sample_width(2)
+            encoder = start_mp3_encoder(filepath, final_audio.frame_rate, final_audio.channels, bitrate='192k')
+            feed_encoder(encoder, final_audio.raw_data)
+            if encoder.wait() != 0:
+                raise RuntimeError(f"MP3 encoding failed with exit code {encoder.returncode}")
             
             log_security_event("MUSIC_GENERATED", f"Generated {style} music: {filename}")
             return filename
@@ -274,47 +418,59 @@ class InvictusAIAgent:
     def synthesize_voice(self, text, voice_style):
         """Synthesize voice from text"""
         try:
+            # Same text and style always produce the same voice track
+            key = hashlib.sha1(f"{voice_style}|{text}".encode()).hexdigest()
+            cached = VOICE_CACHE.get(key)
+            if cached is not None:
+                return AudioSegment.from_wav(io.BytesIO(cached))
+            
             # Generate voice using gTTS
             tts = gTTS(text=text, lang='en', slow=False)
-            temp_file = f"temp_voice_{random.randint(1000, 9999)}.mp3"
-            tts.save(temp_file)
-            
-            # Load and apply effects based on voice style
-            voice_audio = AudioSegment.from_mp3(temp_file)
-            
-            # Apply voice style effects
-            if voice_style == 'heroic_male':
-                # Lower pitch and add reverb
-                voice_audio = voice_audio._spawn(voice_audio.raw_data, overrides={
-                    "frame_rate": int(voice_audio.frame_rate * 0.9)
-                }).set_frame_rate(voice_audio.frame_rate)
-                voice_audio = voice_audio + 3  # Slight volume boost
-            
-            elif voice_style == 'soprano':
-                # Higher pitch and clarity
-                voice_audio = voice_audio._spawn(voice_audio.raw_data, overrides={
-                    "frame_rate": int(voice_audio.frame_rate * 1.2)
-                }).set_frame_rate(voice_audio.frame_rate)
-            
-            elif voice_style == 'choir':
-                # Add harmonies
-                harmony1 = voice_audio._spawn(voice_audio.raw_data, overrides={
-                    "frame_rate": int(voice_audio.frame_rate * 1.05)
-                }).set_frame_rate(voice_audio.frame_rate)
-                harmony2 = voice_audio._spawn(voice_audio.raw_data, overrides={
-                    "frame_rate": int(voice_audio.frame_rate * 0.95)
-                }).set_frame_rate(voice_audio.frame_rate)
+            with tempfile.NamedTemporaryFile(suffix='.mp3', delete=False) as tf:
+                temp_file = tf.name
+            try:
+                tts.save(temp_file)
                 
-                voice_audio = voice_audio.overlay(harmony1 - 6).overlay(harmony2 - 6)
+                # Load and apply effects based on voice style
+                voice_audio = AudioSegment.from_mp3(temp_file)
+            finally:
+                os.unlink(temp_file)
+            
+            # Apply voice style effects; pitch shifts resample one float32 buffer with resample_poly
+            # (up/down is the inverse of the playback speed-up, matching the old frame-rate trick)
+            if voice_style in ('heroic_male', 'soprano', 'choir'):
+                voice_audio = voice_audio.set_sample_width(2)
+                samples = np.frombuffer(voice_audio.raw_data, dtype=np.int16)
+                samples = samples.reshape(-1, voice_audio.channels).astype(np.float32)
+                
+                if voice_style == 'heroic_male':
+                    # Lower pitch with a slight volume boost
+                    shifted = resample_poly(samples, 10, 9, axis=0)
+                    shifted *= np.float32(10 ** (3 / 20))
+                
+                elif voice_style == 'soprano':
+                    # Higher pitch and clarity
+                    shifted = resample_poly(samples, 5, 6, axis=0)
+                
+                else:
+                    # Add harmonies 6 dB down, a little above and below the lead
+                    shifted = samples.copy()
+                    for up, down in ((20, 21), (20, 19)):
+                        harmony = resample_poly(samples, up, down, axis=0)[:len(samples)]
+                        shifted[:len(harmony)] += harmony * np.float32(10 ** (-6 / 20))
+                
+                np.rint(shifted, out=shifted)
+                np.clip(shifted, -32768, 32767, out=shifted)
+                voice_audio = voice_audio._spawn(shifted.astype(np.int16).tobytes())
             
             elif voice_style == 'whisper':
                 # Soft and intimate
                 voice_audio = voice_audio - 10  # Lower volume
                 voice_audio = voice_audio.low_pass_filter(3000)
             
-            # Clean up temp file
-            os.remove(temp_file)
-            
+            wav = io.BytesIO()
+            voice_audio.export(wav, format="wav")
+            VOICE_CACHE.set(key, wav.getvalue())
             return voice_audio
             
         except Exception as e:
@@ -324,54 +480,30 @@ class InvictusAIAgent:
     
     def generate_background_music(self, style, duration_ms):
         """Generate background music for the given style"""
+        partials = self._style_partials.get(style, self._style_partials['default'])
+        return self.synthesize_music(partials, duration_ms)
+    
+    def synthesize_music(self, partials, duration_ms):
+        """Synthesize a music bed from (frequency, amplitude, power) partials"""
         try:
             # Generate simple background music using basic waveforms
             duration_seconds = duration_ms / 1000
             sample_rate = 44100
+            n_samples = int(sample_rate * duration_seconds)
             
-            # Generate time array
-            t = np.linspace(0, duration_seconds, int(sample_rate * duration_seconds))
-            
-            # Style-specific music generation
-            if style == 'epic':
-                # Epic orchestral simulation
-                frequency = 130.81  # C3
-                melody = np.sin(2 * np.pi * frequency * t) * 0.3
-                harmony = np.sin(2 * np.pi * frequency * 1.5 * t) * 0.2  # Perfect fifth
-                rhythm = np.sin(2 * np.pi * 2 * t) ** 8 * 0.1  # Rhythmic element
-                audio_array = melody + harmony + rhythm
-                
-            elif style == 'dark':
-                # Dark, brooding music
-                frequency = 110  # A2
-                melody = np.sin(2 * np.pi * frequency * t) * 0.4
-                sub_bass = np.sin(2 * np.pi * frequency * 0.5 * t) * 0.3
-                audio_array = melody + sub_bass
-                
-            elif style == 'emotional':
-                # Emotional ballad
-                frequency = 261.63  # C4
-                melody = np.sin(2 * np.pi * frequency * t) * 0.3
-                strings = np.sin(2 * np.pi * frequency * 1.25 * t) * 0.2
-                audio_array = melody + strings
-                
-            else:  # Default epic
-                frequency = 196  # G3
-                melody = np.sin(2 * np.pi * frequency * t) * 0.3
-                harmony = np.sin(2 * np.pi * frequency * 1.33 * t) * 0.2
-                audio_array = melody + harmony
-            
-            # Normalize audio
-            audio_array = audio_array / np.max(np.abs(audio_array)) * 0.7
-            
-            # Convert to 16-bit integers
-            audio_array = (audio_array * 32767).astype(np.int16)
+            if HAS_NUMBA:
+                freqs, amps, powers = (np.array(column) for column in zip(*partials))
+                audio_array = np.empty(n_samples, dtype=MUSIC_BED_DTYPE)
+                _synth(n_samples, sample_rate, freqs.astype(np.float64), amps.astype(np.float32),
+                       powers.astype(np.int64), np.iinfo(MUSIC_BED_DTYPE).max, audio_array)
+            else:
+                audio_array = synthesize_partials(partials, n_samples, sample_rate, MUSIC_BED_DTYPE)
             
             # Create AudioSegment
             music_audio = AudioSegment(
                 audio_array.tobytes(),
                 frame_rate=sample_rate,
-                sample_width=2,
+                sample_width=audio_array.itemsize,
                 channels=1
             )
             
@@ -384,22 +516,27 @@ class InvictusAIAgent:
     def mix_audio(self, voice_audio, music_audio):
         """Mix voice and background music"""
         try:
-            # Ensure both audio clips are the same length
-            max_length = max(len(voice_audio), len(music_audio))
-            
-            if len(voice_audio) < max_length:
-                voice_audio = voice_audio + AudioSegment.silent(duration=max_length - len(voice_audio))
-            
-            if len(music_audio) < max_length:
-                music_audio = music_audio + AudioSegment.silent(duration=max_length - len(music_audio))
-            
-            # Lower music volume to make voice prominent
-            music_audio = music_audio - 15  # Reduce music by 15dB
-            
-            # Mix audio
-            mixed_audio = voice_audio.overlay(music_audio)
-            
-            return mixed_audio
+            # Match frame rate and channels the way overlay() would; an 8-bit music bed
+            # is read as-is and scaled up during the mix rather than converted first
+            frame_rate = max(voice_audio.frame_rate, music_audio.frame_rate)
+            channels = max(voice_audio.channels, music_audio.channels)
+            voice_audio = voice_audio.set_frame_rate(frame_rate).set_channels(channels).set_sample_width(2)
+            music_audio = music_audio.set_frame_rate(frame_rate).set_channels(channels)
+            if music_audio.sample_width not in (1, 2):
+                music_audio = music_audio.set_sample_width(2)
+            voice = np.frombuffer(voice_audio.raw_data, dtype=np.int16)
+            music = np.frombuffer(music_audio.raw_data, dtype=np.int8 if music_audio.sample_width == 1 else np.int16)
+            music_scale = 256 if music_audio.sample_width == 1 else 1
+            
+            # One zero-padded float32 buffer as long as the longer clip
+            mixed = np.zeros(max(len(voice), len(music)), dtype=np.float32)
+            mixed[:len(voice)] = voice
+            
+            # Lower music volume by 15 dB to make voice prominent
+            mixed[:len(music)] += np.multiply(music, np.float32(music_scale * 10 ** (-15 / 20)), dtype=np.float32)
+            
+            np.clip(mixed, -32768, 32767, out=mixed)
+            return voice_audio._spawn(mixed.astype(np.int16).tobytes())
             
         except Exception as e:
             log_security_event("AUDIO_MIX_ERROR", str(e), "ERROR")
@@ -421,49 +558,46 @@ class InvictusAIAgent:
             log_security_event("VIDEO_GENERATION_ERROR", str(e), "ERROR")
             return None
     
-    def analyze_lyrics_for_voice(self, lyrics_text, theme):
+    def analyze_lyrics_for_voice(self, theme):
         """AI analysis to select optimal voice style"""
-        theme_lower = theme.lower()
-        
-        if 'battle' in theme_lower or 'war' in theme_lower or 'champion' in theme_lower:
-            return 'heroic_male'
-        elif 'sacred' in theme_lower or 'divine' in theme_lower or 'eternal' in theme_lower:
-            return 'choir'
-        elif 'emotional' in theme_lower or 'love' in theme_lower or 'heart' in theme_lower:
-            return 'soprano'
-        elif 'mystery' in theme_lower or 'secret' in theme_lower:
-            return 'whisper'
-        else:
-            return 'heroic_male'
+        return self._voice_for_theme(theme.lower())
     
-    def analyze_lyrics_for_style(self, lyrics_text, theme):
+    def analyze_lyrics_for_style(self, theme):
         """AI analysis to select optimal music style"""
         theme_lower = theme.lower()
         
         # Check learning data for successful combinations
-        for combo in self.learning_data['successful_combinations']:
-            if combo['theme'].lower() in theme_lower:
+        combinations = self.learning_data['successful_combinations']
+        combo = combinations.get(theme_lower)
+        if combo:
+            combinations.move_to_end(theme_lower)
+            return combo['style']
+        
+        # No exact hit: a learned theme contained in this one still applies
+        for learned_theme, combo in combinations.items():
+            if learned_theme in theme_lower:
                 return combo['style']
         
-        # AI-driven style selection
-        if 'gladiator' in theme_lower or 'arena' in theme_lower:
-            return 'gladiator'
-        elif 'sacred' in theme_lower or 'prayer' in theme_lower:
-            return 'gregorian'
-        elif 'dark' in theme_lower or 'shadow' in theme_lower:
-            return 'dark'
-        elif 'magic' in theme_lower or 'fantasy' in theme_lower:
-            return 'fantasy'
-        elif 'emotional' in theme_lower:
-            return 'emotional'
-        elif 'modern' in theme_lower or 'pop' in theme_lower:
-            return 'pop'
-        else:
-            return 'epic'
+        return self._style_for_theme(theme_lower)
+    
+    @staticmethod
+    @lru_cache(maxsize=512)
+    def _voice_for_theme(theme_lower):
+        """Keyword-based voice style for a lowercased theme"""
+        rule = _first_rule(_VOICE_RE, theme_lower)
+        return _VOICE_RESULTS[rule] if rule is not None else 'heroic_male'
+    
+    @staticmethod
+    @lru_cache(maxsize=512)
+    def _style_for_theme(theme_lower):
+        """Keyword-based music style for a lowercased theme"""
+        rule = _first_rule(_STYLE_RE, theme_lower)
+        return _STYLE_RESULTS[rule] if rule is not None else 'epic'
     
     def learn_from_generation(self, theme, style, voice_style, success_rating=5):
         """Learn from generation results to improve future outputs"""
         self.generation_count += 1
+        timestamp = datetime.now(timezone.utc).isoformat()
         
         # Record successful combination
         if success_rating >= 4:
@@ -472,14 +606,14 @@ class InvictusAIAgent:
                 'style': style,
                 'voice_style': voice_style,
                 'rating': success_rating,
-                'timestamp': datetime.utcnow().isoformat()
+                'timestamp': timestamp
             }
-            self.learning_data['successful_combinations'].append(combination)
+            self.remember_combination(self.learning_data['successful_combinations'], combination)
         
-        # Update style effectiveness
-        if style not in self.learning_data['style_effectiveness']:
-            self.learning_data['style_effectiveness'][style] = []
-        self.learning_data['style_effectiveness'][style].append(success_rating)
+        # Update style effectiveness as a running count and sum
+        effectiveness = self.learning_data['style_effectiveness'].setdefault(style, {'count': 0, 'sum': 0})
+        effectiveness['count'] += 1
+        effectiveness['sum'] += success_rating
         
         # Record generation history
         self.learning_data['generation_history'].append({
@@ -487,45 +621,25 @@ class InvictusAIAgent:
             'theme': theme,
             'style': style,
             'voice_style': voice_style,
-            'timestamp': datetime.utcnow().isoformat()
+            'timestamp': timestamp
         })
         
-        # Keep only last 100 generations
-        if len(self.learning_data['generation_history']) > 100:
-            self.learning_data['generation_history'].pop(0)
-        
-        self.save_learning_data()
+        self._dirty = True
+        if (self.generation_count % LEARNING_FLUSH_EVERY == 0
+                or time.monotonic() - self._last_flush > LEARNING_FLUSH_SECONDS):
+            self.save_learning_data()
         log_security_event("AI_LEARNING_UPDATE", f"Generation {self.generation_count} learned from")
     
-    def get_generation_statistics(self):
-        """Get generation statistics"""
-        try:
-            total_generations = Generation.query.count()
-            completed_generations = Generation.query.filter_by(status='completed').count()
-            failed_generations = Generation.query.filter_by(status='failed').count()
-            
-            success_rate = (completed_generations / total_generations * 100) if total_generations > 0 else 0
-            
-            return {
-                'total_generations': total_generations,
-                'completed_generations': completed_generations,
-                'failed_generations': failed_generations,
-                'success_rate': round(success_rate, 2),
-                'ai_learning_count': len(self.learning_data['successful_combinations']),
-                'voice_styles_available': list(self.voice_styles.keys()),
-                'music_styles_available': list(self.music_styles.keys())
-            }
-        except Exception as e:
-            log_security_event("STATS_ERROR", str(e), "ERROR")
-            return {
-                'total_generations': 0,
-                'completed_generations': 0,
-                'failed_generations': 0,
-                'success_rate': 0,
-                'ai_learning_count': 0,
-                'voice_styles_available': list(self.voice_styles.keys()),
-                'music_styles_available': list(self.music_styles.keys())
-            }
+    @staticmethod
+    def remember_combination(combinations, combination):
+        """Keep the best-rated combination per theme in a bounded LRU-ordered dict"""
+        key = combination['theme'].lower()
+        existing = combinations.get(key)
+        if not existing or combination['rating'] >= existing['rating']:
+            combinations[key] = combination
+        combinations.move_to_end(key)
+        if len(combinations) > LEARNED_COMBINATIONS_LIMIT:
+            combinations.popitem(last=False)
     
     def get_agent_status(self):
         """Get current AI agent status and learning progress"""
@@ -541,38 +655,44 @@ class InvictusAIAgent:
     
     def get_generation_statistics(self):
         """Get comprehensive generation statistics"""
-        from models import Generation
-        from app import db
+        now = time.monotonic()
+        if self._stats_cache and now < self._stats_cache[0]:
+            return dict(self._stats_cache[1], generation_count=self.generation_count)
         
         try:
-            total_generations = db.session.query(Generation).count()
-            successful_generations = db.session.query(Generation).filter_by(status='completed').count()
-            failed_generations = db.session.query(Generation).filter_by(status='failed').count()
-            
-            # Calculate average duration for completed generations
-            completed_gens = db.session.query(Generation).filter(
-                Generation.status == 'completed',
-                Generation.completed_at.isnot(None)
-            ).all()
-            
-            avg_duration = 0
-            if completed_gens:
-                durations = [(gen.completed_at - gen.created_at).total_seconds() for gen in completed_gens]
-                avg_duration = sum(durations) / len(durations)
-            
-            # Count unique themes
-            unique_themes = db.session.query(Generation.theme).distinct().count()
-            
-            return {
+            # Per-status counts, mean completion time and distinct themes in one round trip
+            if db.engine.dialect.name == 'sqlite':
+                duration = (db.func.julianday(Generation.completed_at) - db.func.julianday(Generation.created_at)) * 86400
+            else:
+                duration = db.extract('epoch', Generation.completed_at - Generation.created_at)
+            unique_themes = db.session.query(db.func.count(db.func.distinct(Generation.theme))).scalar_subquery()
+            
+            rows = db.session.query(
+                Generation.status,
+                db.func.count(Generation.id),
+                db.func.avg(duration),
+                unique_themes
+            ).group_by(Generation.status).all()
+            
+            counts = {status: count for status, count, _, _ in rows}
+            avg_duration = next((avg or 0 for status, _, avg, _ in rows if status == 'completed'), 0)
+            
+            total_generations = sum(counts.values())
+            successful_generations = counts.get('completed', 0)
+            failed_generations = counts.get('failed', 0)
+            
+            stats = {
                 'total_generations': total_generations,
                 'successful_generations': successful_generations,
                 'failed_generations': failed_generations,
                 'success_rate': (successful_generations / total_generations * 100) if total_generations > 0 else 0,
-                'average_duration': round(avg_duration, 1),
-                'unique_themes': unique_themes,
+                'average_duration': round(float(avg_duration), 1),
+                'unique_themes': rows[0][3] if rows else 0,
                 'ai_learning_active': True,
                 'generation_count': self.generation_count
             }
+            self._stats_cache = (now + STATS_TTL_SECONDS, stats)
+            return dict(stats)
         except Exception as e:
             log_security_event("STATS_ERROR", str(e), "ERROR")
             return {
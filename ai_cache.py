@@ -0,0 +1,97 @@
+"""
+AI Response Cache for CodeCraft Studio
+Exact and semantic caching of OpenAI responses
+© 2025 Ervin Remus Radosavlevici
+"""
+
+import hashlib
+import threading
+import diskcache
+import numpy as np
+import orjson
+
+# Embedding model used for the semantic tier
+EMBEDDING_MODEL = "text-embedding-3-small"
+
+class LLMCache:
+    """Two-tier response cache: exact prompt hash first, then embedding similarity"""
+
+    def __init__(self, directory, ttl=86400, threshold=0.92, max_vectors=2048):
+        self.store = diskcache.Cache(directory)
+        self.ttl = ttl
+        self.threshold = threshold
+        self.max_vectors = max_vectors
+
+        # In-memory similarity index over stored entries, rebuilt from disk at startup
+        self._lock = threading.Lock()
+        self._keys = []
+        self._indexed = set()
+        self._vectors = None
+        for key in self.store.iterkeys():
+            entry = self.store.get(key)
+            if entry is not None and entry[1] is not None:
+                self._index(key, entry[1])
+
+    @staticmethod
+    def make_key(model, messages):
+        """Exact-match key for one chat request"""
+        payload = orjson.dumps({'model': model, 'messages': messages}, option=orjson.OPT_SORT_KEYS)
+        return hashlib.sha256(payload).hexdigest()
+
+    @staticmethod
+    def normalize(embedding):
+        """Unit-length float32 vector, so a dot product is the cosine similarity"""
+        vector = np.asarray(embedding, dtype=np.float32)
+        return vector / (np.linalg.norm(vector) or 1.0)
+
+    def get(self, key):
+        """Cached value for an exact request key, or None"""
+        entry = self.store.get(key)
+        return entry[0] if entry is not None else None
+
+    def get_similar(self, vector):
+        """Cached value for the most similar live request above the threshold, or None"""
+        with self._lock:
+            if self._vectors is None:
+                return None
+            scores = self._vectors @ vector
+            matches = np.flatnonzero(scores >= self.threshold)
+            candidates = [self._keys[i] for i in matches[np.argsort(scores[matches])[::-1]]]
+
+        # Entries may have expired since they were indexed; drop those and try the next best
+        for similar_key in candidates:
+            value = self.get(similar_key)
+            if value is not None:
+                return value
+            self._unindex(similar_key)
+        return None
+
+    def set(self, key, value, vector=None):
+        """Store value under key, indexing its vector for similarity lookups"""
+        self.store.set(key, (value, vector), expire=self.ttl)
+        if vector is not None:
+            self._index(key, vector)
+
+    def _index(self, key, vector):
+        """Add a vector to the similarity index, dropping the oldest beyond max_vectors"""
+        with self._lock:
+            if key in self._indexed:
+                return
+            row = vector[np.newaxis, :]
+            self._vectors = row if self._vectors is None else np.vstack((self._vectors, row))
+            self._keys.append(key)
+            self._indexed.add(key)
+            if len(self._keys) > self.max_vectors:
+                self._indexed.difference_update(self._keys[:-self.max_vectors])
+                self._vectors = self._vectors[-self.max_vectors:]
+                self._keys = self._keys[-self.max_vectors:]
+
+    def _unindex(self, key):
+        """Remove an expired key from the similarity index"""
+        with self._lock:
+            if key not in self._indexed:
+                return
+            i = self._keys.index(key)
+            del self._keys[i]
+            self._indexed.discard(key)
+            self._vectors = np.delete(self._vectors, i, axis=0) if self._keys else None
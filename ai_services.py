@@ -6,17 +6,59 @@ Handles OpenAI integration for lyrics generation and music enhancement
 
 import os
 import json
+import asyncio
 import logging
+import time
 from datetime import datetime
 from security.rados_security import log_security_event
+from ai_cache import LLMCache, EMBEDDING_MODEL
+from analytics import analytics
 
 try:
-    from openai import OpenAI
+    from openai import OpenAI, AsyncOpenAI
     OPENAI_AVAILABLE = True
 except ImportError:
     OPENAI_AVAILABLE = False
     log_security_event("OPENAI_IMPORT_WARNING", "OpenAI library not available", "WARNING")
 
+# Batch lyrics requests in flight at once, and SDK retries (exponential backoff, honours 429s)
+LYRICS_BATCH_CONCURRENCY = 20
+LYRICS_BATCH_MAX_RETRIES = 4
+
+# Six sections plus the duplicated full_text run to about 750 tokens; a truncated reply is invalid JSON
+LYRICS_MAX_TOKENS = 1500
+
+# Embeddings only feed the semantic cache, so a slow one is abandoned without retries and treated as a miss
+EMBEDDING_TIMEOUT = 3.0
+
+# Static lyrics prompt; request-specific theme and title are sent last, after this shared prefix
+LYRICS_SYSTEM = "You are a master lyricist who creates epic, cinematic song lyrics. Always respond with valid JSON."
+LYRICS_INSTRUCTIONS = """Create powerful, cinematic lyrics for the song whose theme and title follow.
+
+Generate lyrics that are:
+- Epic and emotionally resonant
+- Suitable for orchestral/cinematic music
+- Structured with verses and choruses
+- Inspiring and uplifting
+
+Please provide the lyrics in this JSON format, using the given title and theme:
+{
+    "title": "song title",
+    "theme": "song theme",
+    "verses": [
+        {"type": "verse", "lyrics": "verse 1 lyrics here", "timing": "0:30"},
+        {"type": "chorus", "lyrics": "chorus lyrics here", "timing": "30:60"},
+        {"type": "verse", "lyrics": "verse 2 lyrics here", "timing": "60:90"},
+        {"type": "chorus", "lyrics": "chorus lyrics here", "timing": "90:120"},
+        {"type": "bridge", "lyrics": "bridge lyrics here", "timing": "120:150"},
+        {"type": "chorus", "lyrics": "final chorus lyrics here", "timing": "150:180"}
+    ],
+    "full_text": "complete song lyrics as one text"
+}"""
+
+# Lyrics responses by exact prompt, then by theme/title similarity
+LYRICS_CACHE = LLMCache('logs/ai_cache/lyrics')
+
 class AIServices:
     # the newest OpenAI model is "gpt-4o" which was released May 13, 2024.
     # do not change this unless explicitly requested by the user
@@ -28,81 +70,191 @@ class AIServices:
         logging.warning("OpenAI API key not found. AI features will be limited.")
 
     @staticmethod
-    def generate_lyrics(theme, title):
-        """Generate lyrics using OpenAI API"""
-        try:
-            # Enhanced prompt for better lyric generation
-            prompt = f"""Create powerful, cinematic lyrics for a song titled "{title}" with the theme "{theme}".
-
-Generate lyrics that are:
-- Epic and emotionally resonant
-- Suitable for orchestral/cinematic music
-- Structured with verses and choruses
-- Inspiring and uplifting
+    def _lyrics_messages(theme, title):
+        """Chat messages for one lyrics request; the static prefix is shared so OpenAI can cache it"""
+        return [
+            {"role": "system", "content": LYRICS_SYSTEM},
+            {"role": "user", "content": LYRICS_INSTRUCTIONS},
+            {"role": "user", "content": f"Theme: {theme}\nTitle: {title}"}
+        ]
 
-Theme: {theme}
-Title: {title}
+    @staticmethod
+    def _lyrics_request_text(theme, title):
+        """Text embedded to find earlier lyrics requests with a similar theme and title"""
+        return f"Theme: {theme}\nTitle: {title}"
 
-Please provide the lyrics in this JSON format:
-{{
-    "title": "{title}",
-    "theme": "{theme}",
-    "verses": [
-        {{"type": "verse", "lyrics": "verse 1 lyrics here", "timing": "0:30"}},
-        {{"type": "chorus", "lyrics": "chorus lyrics here", "timing": "30:60"}},
-        {{"type": "verse", "lyrics": "verse 2 lyrics here", "timing": "60:90"}},
-        {{"type": "chorus", "lyrics": "chorus lyrics here", "timing": "90:120"}},
-        {{"type": "bridge", "lyrics": "bridge lyrics here", "timing": "120:150"}},
-        {{"type": "chorus", "lyrics": "final chorus lyrics here", "timing": "150:180"}}
-    ],
-    "full_text": "complete song lyrics as one text"
-}}"""
+    @staticmethod
+    def _lyrics_vector(embedding_response):
+        """Unit vector from an embeddings API response"""
+        return LLMCache.normalize(embedding_response.data[0].embedding)
 
+    @staticmethod
+    def generate_lyrics(theme, title, fallback=None):
+        """Generate lyrics using OpenAI API; fallback(theme, title) supplies lyrics when that fails"""
+        fallback = fallback or AIServices._get_fallback_lyrics
+        try:
             if not AIServices.openai_client:
-                return AIServices._get_fallback_lyrics(theme, title)
+                return fallback(theme, title)
 
             client = AIServices.openai_client
+            messages = AIServices._lyrics_messages(theme, title)
+            key = LLMCache.make_key("gpt-4o", messages)
+            cached = LYRICS_CACHE.get(key)
+            if cached is not None:
+                return cached
 
-            # Add timeout to prevent worker timeouts
-            import signal
-
-            def timeout_handler(signum, frame):
-                raise TimeoutError("OpenAI API call timed out")
-
-            signal.signal(signal.SIGALRM, timeout_handler)
-            signal.alarm(15)  # 15 second timeout for lyrics
+            try:
+                vector = AIServices._lyrics_vector(
+                    client.with_options(timeout=EMBEDDING_TIMEOUT, max_retries=0).embeddings.create(
+                        model=EMBEDDING_MODEL, input=AIServices._lyrics_request_text(theme, title)))
+                cached = LYRICS_CACHE.get_similar(vector)
+                if cached is not None:
+                    return dict(cached, title=title, theme=theme)
+            except Exception as e:
+                logging.warning(f"Lyrics embedding failed: {e}")
+                vector = None
 
             try:
                 # the newest OpenAI model is "gpt-4o" which was released May 13, 2024. 
                 # do not change this unless explicitly requested by the user
                 response = client.chat.completions.create(
                     model="gpt-4o",
-                    messages=[
-                        {"role": "system", "content": "You are a master lyricist who creates epic, cinematic song lyrics. Always respond with valid JSON."},
-                        {"role": "user", "content": prompt}
-                    ],
+                    messages=messages,
                     response_format={"type": "json_object"},
+                    max_tokens=LYRICS_MAX_TOKENS,
                     timeout=12.0  # 12 second timeout
                 )
 
                 result = json.loads(response.choices[0].message.content)
-                signal.alarm(0)  # Cancel timeout
+                LYRICS_CACHE.set(key, result, vector)
                 log_security_event("LYRICS_GENERATED", f"Theme: {theme}, Title: {title}")
 
                 return result
 
-            except (TimeoutError, Exception) as api_error:
-                signal.alarm(0)  # Cancel timeout
+            except Exception as api_error:
                 logging.error(f"OpenAI lyrics generation failed: {api_error}")
-                return AIServices._get_fallback_lyrics(theme, title)
-
-            finally:
-                signal.alarm(0)  # Ensure timeout is always cancelled
+                return fallback(theme, title)
 
         except Exception as e:
             log_security_event("LYRICS_GENERATION_ERROR", str(e), "ERROR")
+            return fallback(theme, title)
+
+    @staticmethod
+    def generate_lyrics_stream(theme, title):
+        """Stream lyrics as ('delta', text) events while OpenAI writes them, ending with ('lyrics', dict)"""
+        if not AIServices.openai_client:
+            yield 'lyrics', AIServices._get_fallback_lyrics(theme, title)
+            return
+
+        messages = AIServices._lyrics_messages(theme, title)
+        key = LLMCache.make_key("gpt-4o", messages)
+        cached = LYRICS_CACHE.get(key)
+        if cached is not None:
+            yield 'lyrics', cached
+            return
+
+        try:
+            started = time.perf_counter()
+            first_token_at = None
+            parts = []
+            stream = AIServices.openai_client.chat.completions.create(
+                model="gpt-4o",
+                messages=messages,
+                response_format={"type": "json_object"},
+                max_tokens=LYRICS_MAX_TOKENS,
+                stream=True,
+                timeout=12.0
+            )
+            for chunk in stream:
+                delta = chunk.choices[0].delta.content if chunk.choices else None
+                if not delta:
+                    continue
+                if first_token_at is None:
+                    first_token_at = time.perf_counter()
+                    analytics.track_response_time("openai.lyrics.ttft", (first_token_at - started) * 1000)
+                parts.append(delta)
+                yield 'delta', delta
+
+            analytics.track_response_time("openai.lyrics.total", (time.perf_counter() - started) * 1000)
+
+            # JSON mode output is only parseable once complete
+            result = json.loads(''.join(parts))
+            LYRICS_CACHE.set(key, result)
+            log_security_event("LYRICS_GENERATED", f"Theme: {theme}, Title: {title}")
+            yield 'lyrics', result
+
+        except Exception as e:
+            logging.error(f"OpenAI lyrics streaming failed: {e}")
+            yield 'lyrics', AIServices._get_fallback_lyrics(theme, title)
+
+    @staticmethod
+    async def generate_lyrics_async(theme, title, client, semaphore):
+        """Generate lyrics with the async OpenAI client, at most semaphore-many at a time"""
+        messages = AIServices._lyrics_messages(theme, title)
+        key = LLMCache.make_key("gpt-4o", messages)
+        cached = LYRICS_CACHE.get(key)
+        if cached is not None:
+            return cached
+
+        try:
+            async with semaphore:
+                try:
+                    vector = AIServices._lyrics_vector(
+                        await client.with_options(timeout=EMBEDDING_TIMEOUT, max_retries=0).embeddings.create(
+                            model=EMBEDDING_MODEL, input=AIServices._lyrics_request_text(theme, title)))
+                    cached = LYRICS_CACHE.get_similar(vector)
+                    if cached is not None:
+                        return dict(cached, title=title, theme=theme)
+                except Exception as e:
+                    logging.warning(f"Lyrics embedding failed: {e}")
+                    vector = None
+
+                response = await client.chat.completions.create(
+                    model="gpt-4o",
+                    messages=messages,
+                    response_format={"type": "json_object"},
+                    max_tokens=LYRICS_MAX_TOKENS,
+                    timeout=12.0
+                )
+
+            result = json.loads(response.choices[0].message.content)
+            LYRICS_CACHE.set(key, result, vector)
+            log_security_event("LYRICS_GENERATED", f"Theme: {theme}, Title: {title}")
+            return result
+
+        except Exception as api_error:
+            logging.error(f"OpenAI lyrics generation failed: {api_error}")
             return AIServices._get_fallback_lyrics(theme, title)
 
+    @staticmethod
+    def generate_lyrics_batch(theme_title_pairs, timeout=None):
+        """Generate lyrics for several (theme, title) pairs concurrently; songs unfinished after timeout seconds get fallback lyrics"""
+        if not AIServices.openai_client or not theme_title_pairs:
+            return [AIServices._get_fallback_lyrics(theme, title) for theme, title in theme_title_pairs]
+
+        async def request_all():
+            # Async clients are bound to their event loop, so each batch gets its own
+            semaphore = asyncio.Semaphore(LYRICS_BATCH_CONCURRENCY)
+            async with AsyncOpenAI(api_key=AIServices.OPENAI_API_KEY,
+                                   max_retries=LYRICS_BATCH_MAX_RETRIES) as client:
+                tasks = [
+                    asyncio.ensure_future(AIServices.generate_lyrics_async(theme, title, client, semaphore))
+                    for theme, title in theme_title_pairs
+                ]
+                done, pending = await asyncio.wait(tasks, timeout=timeout)
+                for task in pending:
+                    task.cancel()
+                await asyncio.gather(*pending, return_exceptions=True)
+
+            if pending:
+                log_security_event("LYRICS_BATCH_TIMEOUT", f"Unfinished songs: {len(pending)}", "WARNING")
+            return [
+                task.result() if task in done else AIServices._get_fallback_lyrics(theme, title)
+                for task, (theme, title) in zip(tasks, theme_title_pairs)
+            ]
+
+        return asyncio.run(request_all())
+
     @staticmethod
     def _get_fallback_lyrics(theme, title):
         """Return fallback lyrics when AI is not available"""
@@ -6,72 +6,244 @@ Real-time analytics and performance monitoring
 
 import json
 import os
+import logging
+import orjson
+import time
+import heapq
+import sqlite3
+import atexit
+import threading
+from itertools import groupby
+from operator import itemgetter
 from datetime import datetime, timedelta
-from collections import defaultdict
+from collections import Counter, defaultdict, deque
+
+# Pending request events are folded into the stored metrics once this many accumulate
+TRACK_FOLD_EVERY = 64
+
+# Window for the recent page view count
+RECENT_VIEWS_SECONDS = 86400
+
+# Page views live in SQLite (WAL) so memory stays bounded and every worker shares the counts
+ANALYTICS_DB_PATH = 'logs/analytics/page_views.db'
+ANALYTICS_RETENTION_SECONDS = 30 * 86400
+ANALYTICS_PRUNE_EVERY_SECONDS = 3600
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS page_views (ts REAL NOT NULL, path TEXT NOT NULL);
+CREATE INDEX IF NOT EXISTS idx_page_views_ts ON page_views (ts);
+CREATE TABLE IF NOT EXISTS page_view_counts (path TEXT PRIMARY KEY, views INTEGER NOT NULL) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS page_view_minutes (minute INTEGER PRIMARY KEY, views INTEGER NOT NULL);
+"""
+
+def open_page_view_db(path=ANALYTICS_DB_PATH):
+    """Open the page view store in WAL mode, creating it if needed"""
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    conn = sqlite3.connect(path, timeout=5, check_same_thread=False)
+    conn.execute('PRAGMA journal_mode=WAL')
+    conn.execute('PRAGMA synchronous=NORMAL')
+    conn.executescript(_SCHEMA)
+    return conn
 
 class Analytics:
     """Production analytics tracking"""
 
     def __init__(self):
-        self.page_views = defaultdict(list)
+        # Bounded ring buffer: the oldest entries drop off in O(1) as new ones arrive.
+        # Event timestamps are epoch seconds, formatted as ISO strings only in reports
         self.generation_metrics = {
             'total_started': 0,
             'total_completed': 0,
             'total_failed': 0,
-            'response_times': []
+            'response_times': deque(maxlen=1000)
         }
         self.user_metrics = defaultdict(dict)
 
+        # Running aggregates so the summary never rescans stored events
+        self.response_time_sum = 0.0
+        self.slow_response_count = 0
+
+        # Request hooks only append to this thread-safe deque; folding happens in batches under the lock
+        self._pending = deque()
+        self._fold_lock = threading.Lock()
+
+        # Opened on first fold, not at import; shared by threads under _fold_lock
+        self._db = None
+        self._db_failed = False
+        self._last_prune = 0.0
+        atexit.register(self.flush)
+
+    def _page_view_db(self):
+        """Page view connection, or None if the store is unavailable; the caller holds _fold_lock"""
+        if self._db is None and not self._db_failed:
+            try:
+                self._db = open_page_view_db()
+            except Exception as e:
+                self._db_failed = True
+                logging.warning(f"Page view store unavailable, page views will not be recorded: {e}")
+        return self._db
+
+    def _prune(self, conn, now):
+        """Drop page view rows past retention and minute buckets outside the recent window"""
+        with conn:
+            conn.execute('DELETE FROM page_views WHERE ts < ?', (now - ANALYTICS_RETENTION_SECONDS,))
+            conn.execute('DELETE FROM page_view_minutes WHERE minute < ?',
+                         (int((now - RECENT_VIEWS_SECONDS) // 60),))
+        self._last_prune = now
+
     def track_page_view(self, path, user_agent="", ip=""):
         """Track page views"""
-        self.page_views[path].append({
-            'timestamp': datetime.utcnow().isoformat(),
-            'user_agent': user_agent,
-            'ip': ip
-        })
+        self._pending.append(('view', path, {'timestamp': time.time()}))
+        self._maybe_fold()
 
     def track_response_time(self, endpoint, response_time_ms):
         """Track response times"""
-        self.generation_metrics['response_times'].append({
+        self._pending.append(('response', endpoint, {
             'endpoint': endpoint,
             'time_ms': response_time_ms,
-            'timestamp': datetime.utcnow().isoformat()
-        })
+            'timestamp': time.time()
+        }))
+        self._maybe_fold()
+
+    def _maybe_fold(self):
+        """Fold pending events once a batch is ready, unless another thread already is"""
+        if len(self._pending) >= TRACK_FOLD_EVERY and self._fold_lock.acquire(blocking=False):
+            try:
+                self._fold_pending()
+            finally:
+                self._fold_lock.release()
 
-        # Keep only last 1000 entries
-        if len(self.generation_metrics['response_times']) > 1000:
-            self.generation_metrics['response_times'] = self.generation_metrics['response_times'][-1000:]
+    def _fold_pending(self):
+        """Apply pending events to the stored metrics; the caller holds _fold_lock"""
+        response_times = self.generation_metrics['response_times']
+        views = []
+        while True:
+            try:
+                kind, key, record = self._pending.popleft()
+            except IndexError:
+                break
+
+            if kind == 'view':
+                views.append((record['timestamp'], key))
+                continue
+
+            # Take the entry about to be evicted out of the windowed aggregates
+            if len(response_times) == response_times.maxlen:
+                evicted = response_times[0]['time_ms']
+                self.response_time_sum -= evicted
+                self.slow_response_count -= evicted > 1000
+
+            response_times.append(record)
+            self.response_time_sum += record['time_ms']
+            self.slow_response_count += record['time_ms'] > 1000
+
+        if views:
+            self._store_page_views(views)
+
+    def _store_page_views(self, views):
+        """Write a batch of (timestamp, path) page views and their counters in one transaction"""
+        conn = self._page_view_db()
+        if conn is None:
+            return
+        try:
+            with conn:
+                conn.executemany('INSERT INTO page_views (ts, path) VALUES (?, ?)', views)
+                conn.executemany(
+                    'INSERT INTO page_view_counts (path, views) VALUES (?, ?) '
+                    'ON CONFLICT(path) DO UPDATE SET views = views + excluded.views',
+                    Counter(path for _, path in views).items())
+                conn.executemany(
+                    'INSERT INTO page_view_minutes (minute, views) VALUES (?, ?) '
+                    'ON CONFLICT(minute) DO UPDATE SET views = views + excluded.views',
+                    Counter(int(ts // 60) for ts, _ in views).items())
+
+            now = time.time()
+            if now - self._last_prune >= ANALYTICS_PRUNE_EVERY_SECONDS:
+                self._prune(conn, now)
+        except Exception as e:
+            logging.error(f"Page view write failed: {e}")
+
+    def flush(self):
+        """Fold and store every pending event; runs at exit so a worker's last batch is kept"""
+        with self._fold_lock:
+            self._fold_pending()
 
     def get_analytics_summary(self):
         """Get comprehensive analytics summary"""
+        with self._fold_lock:
+            self._fold_pending()
+            return self._build_summary()
+
+    def _build_summary(self):
+        """Summary of the stored metrics; the caller holds _fold_lock"""
+        page_views = self._get_page_view_counts()
         return {
-            'page_views': {path: len(views) for path, views in self.page_views.items()},
-            'generation_metrics': self.generation_metrics,
-            'popular_pages': self._get_popular_pages(),
+            'page_views': page_views,
+            'recent_views_24h': self._count_recent_views(),
+            'generation_metrics': dict(self.generation_metrics, response_times=[
+                dict(rt, timestamp=datetime.utcfromtimestamp(rt['timestamp']).isoformat())
+                for rt in self.generation_metrics['response_times']
+            ]),
+            'popular_pages': self._get_popular_pages(page_views),
             'performance_stats': self._get_performance_stats(),
             'timestamp': datetime.utcnow().isoformat()
         }
 
-    def _get_popular_pages(self):
+    def export_analytics_report(self, path=None):
+        """Write the summary and raw page view timestamps per path to a JSON report, one path at a time"""
+        path = path or f"logs/analytics/report_{datetime.utcnow().strftime('%Y%m%d_%H%M%S')}.json"
+        try:
+            os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+            with self._fold_lock, open(path, 'wb') as f:
+                self._fold_pending()
+                f.write(b'{"summary":')
+                f.write(orjson.dumps(self._build_summary()))
+                f.write(b',"page_views":{')
+                conn = self._page_view_db()
+                if conn is not None:
+                    rows = conn.execute('SELECT path, ts FROM page_views ORDER BY path, ts')
+                    for i, (page, views) in enumerate(groupby(rows, key=itemgetter(0))):
+                        if i:
+                            f.write(b',')
+                        f.write(orjson.dumps(page))
+                        f.write(b':')
+                        f.write(orjson.dumps([ts for _, ts in views]))
+                f.write(b'}}')
+            return path
+        except Exception as e:
+            logging.error(f"Analytics export failed: {e}")
+            return None
+
+    def _get_page_view_counts(self):
+        """All-time page views per path"""
+        conn = self._page_view_db()
+        if conn is None:
+            return {}
+        return dict(conn.execute('SELECT path, views FROM page_view_counts'))
+
+    def _count_recent_views(self):
+        """Count page views inside the recent window, to the minute"""
+        conn = self._page_view_db()
+        if conn is None:
+            return 0
+        window_start = int((time.time() - RECENT_VIEWS_SECONDS) // 60)
+        return conn.execute('SELECT COALESCE(SUM(views), 0) FROM page_view_minutes WHERE minute >= ?',
+                            (window_start,)).fetchone()[0]
+
+    def _get_popular_pages(self, page_views):
         """Get most popular pages"""
-        page_counts = [(path, len(views)) for path, views in self.page_views.items()]
-        return sorted(page_counts, key=lambda x: x[1], reverse=True)[:10]
+        return heapq.nlargest(10, page_views.items(), key=itemgetter(1))
 
     def _get_performance_stats(self):
         """Get performance statistics"""
-        if not self.generation_metrics['response_times']:
+        count = len(self.generation_metrics['response_times'])
+        if not count:
             return {'average_response_time': 0, 'slow_endpoints': []}
 
-        times = [rt['time_ms'] for rt in self.generation_metrics['response_times']]
-        avg_time = sum(times) / len(times)
-
-        # Find slow endpoints (>1000ms)
-        slow_endpoints = [rt for rt in self.generation_metrics['response_times'] if rt['time_ms'] > 1000]
-
         return {
-            'average_response_time': round(avg_time, 2),
-            'slow_endpoints': len(slow_endpoints)
+            'average_response_time': round(self.response_time_sum / count, 2),
+            'slow_endpoints': self.slow_response_count  # responses over 1000ms in the window
         }
 
 # Global analytics instance
-analytics = Analytics()
\ No newline at end of file
+analytics = Analytics()
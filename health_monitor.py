@@ -16,12 +16,14 @@ class HealthMonitor:
     def __init__(self):
         self.start_time = time.time()
         self.health_checks = []
+        # Prime the CPU counter so later non-blocking reads measure usage since the previous poll
+        psutil.cpu_percent(interval=None)
 
     def get_health_status(self):
         """Get comprehensive health status"""
         try:
-            # System metrics
-            cpu_percent = psutil.cpu_percent(interval=1)
+            # System metrics; CPU usage is measured since the previous poll instead of sleeping a second
+            cpu_percent = psutil.cpu_percent(interval=None)
             memory = psutil.virtual_memory()
             disk = psutil.disk_usage('/')
 
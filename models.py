@@ -15,7 +15,7 @@ class Generation(db.Model):
     id = db.Column(db.Integer, primary_key=True)
     theme = db.Column(db.String(200), nullable=False)
     title = db.Column(db.String(200), nullable=False)
-    status = db.Column(db.String(50), default='pending')
+    status = db.Column(db.String(50), default='pending', index=True)
     music_style = db.Column(db.String(100), default='epic')
     voice_style = db.Column(db.String(100), default='heroic_male')
     lyrics_data = db.Column(db.Text)
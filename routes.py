@@ -7,11 +7,12 @@ Handles all web requests and API endpoints
 © 2025 Ervin Remus Radosavlevici
 """
 
-from flask import render_template, request, redirect, url_for, flash, send_file, jsonify, session, Blueprint
+from flask import current_app, render_template, request, redirect, url_for, flash, send_file, jsonify, session, Blueprint, Response, stream_with_context
 from app import db
 from models import Generation, SecurityLog
 from business_licensing import BusinessLicense, SalesRecord, license_manager
-from ai_agent import InvictusAIAgent
+from ai_agent import invictus_ai
+from ai_services import AIServices
 from youtube_uploader import YouTubeUploader
 from collaboration_system import collaboration_system
 from advanced_audio_mixer import AdvancedAudioMixer
@@ -23,18 +24,32 @@ import uuid
 import logging
 import time
 from datetime import datetime
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeoutError
 from health_monitor import health_monitor
 from analytics import analytics
 
 # Create blueprint for routes
 main_bp = Blueprint('main', __name__)
 
-# Initialize all systems
-ai_agent = InvictusAIAgent()
+# Initialize all systems; the AI agent is shared with ai_agent's module instance
+ai_agent = invictus_ai
 youtube_uploader = YouTubeUploader()
 audio_mixer = AdvancedAudioMixer()
 voice_trainer = VoiceTrainingSystem()
 
+# Generation runs on a worker thread so the request can give up before gunicorn's 30 second timeout
+GENERATION_TIMEOUT_SECONDS = 25
+generation_executor = ThreadPoolExecutor(max_workers=4, thread_name_prefix='generation')
+
+# Songs accepted by one lyrics batch request, and how long the batch may run inside gunicorn's 30 second timeout
+LYRICS_BATCH_LIMIT = 20
+LYRICS_BATCH_TIMEOUT_SECONDS = 25
+
+def _generate_in_app_context(app, theme, title):
+    """Run a generation on a worker thread with the app context it needs for the database"""
+    with app.app_context():
+        return ai_agent.generate_complete_content(theme, title)
+
 @main_bp.route('/')
 def index():
     """Main page"""
@@ -90,33 +105,21 @@ def generate():
             try:
                 log_security_event("GENERATION_REQUEST", f"Theme: {theme}, Title: {title}")
 
-                # Add production timeout wrapper
-                import signal
-
-                def timeout_handler(signum, frame):
-                    raise TimeoutError("Generation timed out")
-
-                signal.signal(signal.SIGALRM, timeout_handler)
-                signal.alarm(25)  # 25 second total timeout
+                future = generation_executor.submit(
+                    _generate_in_app_context, current_app._get_current_object(), theme, title)
 
                 try:
                     # Use AI agent to generate complete content
-                    result = ai_agent.generate_complete_content(theme, title)
-                    signal.alarm(0)  # Cancel timeout
+                    result = future.result(timeout=GENERATION_TIMEOUT_SECONDS)
 
                     flash("Generation completed successfully!", "success")
                     return redirect(url_for('main.results', generation_id=result['id']))
 
-                except TimeoutError:
-                    signal.alarm(0)
+                except FutureTimeoutError:
                     log_security_event("GENERATION_TIMEOUT", f"Theme: {theme}")
                     flash("Generation timed out. Please try a simpler theme.", "warning")
                     return render_template('generate.html')
 
-                except Exception as gen_error:
-                    signal.alarm(0)
-                    raise gen_error
-
             except Exception as e:
                 log_security_event("GENERATION_PROCESS_ERROR", str(e), "ERROR")
 
@@ -235,6 +238,22 @@ def analytics_dashboard():
         log_security_event("ANALYTICS_ERROR", str(e), "ERROR")
         return jsonify({'error': str(e)}), 500
 
+@main_bp.route('/analytics/export')
+def export_analytics():
+    """Download a full analytics report (admin only)"""
+    try:
+        enforce_rados_protection()
+
+        report_file = analytics.export_analytics_report()
+        if not report_file:
+            return jsonify({'error': 'Analytics export failed'}), 500
+
+        log_security_event("ANALYTICS_EXPORTED", f"Report: {report_file}")
+        return send_file(report_file, mimetype='application/json', as_attachment=True)
+    except Exception as e:
+        log_security_event("ANALYTICS_EXPORT_ERROR", str(e), "ERROR")
+        return jsonify({'error': str(e)}), 500
+
 @main_bp.route('/status')
 def system_status():
     """Comprehensive system status"""
@@ -333,6 +352,56 @@ def create_collaboration():
         log_security_event("COLLABORATION_CREATE_ERROR", str(e), "ERROR")
         return jsonify({"error": str(e)}), 500
 
+@main_bp.route('/api/lyrics/stream')
+def stream_lyrics():
+    """Stream AI lyrics generation as server-sent events"""
+    try:
+        enforce_rados_protection()
+
+        theme = request.args.get('theme', '').strip()
+        title = request.args.get('title', '').strip() or f"Invictus {theme}"
+
+        if len(theme) < 3:
+            return jsonify({"error": "Theme must be at least 3 characters long"}), 400
+
+        def events():
+            for event, payload in AIServices.generate_lyrics_stream(theme, title):
+                yield f"event: {event}\ndata: {json.dumps(payload)}\n\n"
+
+        log_security_event("LYRICS_STREAM_REQUEST", f"Theme: {theme}, Title: {title}")
+        return Response(stream_with_context(events()), mimetype='text/event-stream',
+                        headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
+
+    except Exception as e:
+        log_security_event("LYRICS_STREAM_ERROR", str(e), "ERROR")
+        return jsonify({"error": str(e)}), 500
+
+@main_bp.route('/api/lyrics/batch', methods=['POST'])
+def generate_lyrics_batch():
+    """Generate lyrics for several songs with concurrent AI requests"""
+    try:
+        enforce_rados_protection()
+
+        songs = request.json.get('songs', [])
+        if not songs or len(songs) > LYRICS_BATCH_LIMIT:
+            return jsonify({"error": f"Between 1 and {LYRICS_BATCH_LIMIT} songs required"}), 400
+
+        pairs = []
+        for song in songs:
+            theme = str(song.get('theme', '')).strip()
+            if len(theme) < 3:
+                return jsonify({"error": "Theme must be at least 3 characters long"}), 400
+            pairs.append((theme, str(song.get('title', '')).strip() or f"Invictus {theme}"))
+
+        lyrics = AIServices.generate_lyrics_batch(pairs, timeout=LYRICS_BATCH_TIMEOUT_SECONDS)
+
+        log_security_event("LYRICS_BATCH_GENERATED", f"Songs: {len(pairs)}")
+        return jsonify({"lyrics": lyrics})
+
+    except Exception as e:
+        log_security_event("LYRICS_BATCH_ERROR", str(e), "ERROR")
+        return jsonify({"error": str(e)}), 500
+
 @main_bp.route('/api/audio/mix', methods=['POST'])
 def create_audio_mix():
     """Create professional audio mix"""
@@ -174,6 +174,9 @@ Advanced Security System for CodeCraft Studio
 
 import os
 import json
+import atexit
+import queue
+import threading
 import hashlib
 import logging
 from datetime import datetime, timedelta
@@ -181,13 +184,14 @@ from functools import wraps
 from flask import request, abort, current_app
 import uuid
 import time
+from collections import deque
 
 # Security Configuration
 SECURITY_CONFIG = {
     'max_requests_per_minute': 60,
     'max_generations_per_hour': 10,
     'blocked_ips': set(),
-    'security_events': [],
+    'security_events': deque(maxlen=1000),  # most recent events only
     'rate_limits': {},
     'file_upload_max_size': 10 * 1024 * 1024,  # 10MB
     'allowed_file_types': ['.txt', '.json', '.wav', '.mp3'],
@@ -196,6 +200,44 @@ SECURITY_CONFIG = {
     'enforcement_active': True
 }
 
+# Security log lines are written by a background thread so callers never block on file I/O
+_event_queue = queue.SimpleQueue()
+_event_write_lock = threading.Lock()
+
+def _write_security_events(events):
+    """Append a batch of security events to their daily log files"""
+    try:
+        os.makedirs('logs', exist_ok=True)
+        lines_by_file = {}
+        for event in events:
+            log_file = f"logs/security_{event['timestamp'][:10].replace('-', '')}.log"
+            lines_by_file.setdefault(log_file, []).append(f"{json.dumps(event)}\n")
+        with _event_write_lock:
+            for log_file, lines in lines_by_file.items():
+                with open(log_file, 'a') as f:
+                    f.writelines(lines)
+    except Exception as e:
+        logging.error(f"Security log write failed: {e}")
+
+def _drain_security_events(block=True):
+    """Write every queued security event; optionally wait for the first one"""
+    events = [_event_queue.get()] if block else []
+    while True:
+        try:
+            events.append(_event_queue.get_nowait())
+        except queue.Empty:
+            break
+    if events:
+        _write_security_events(events)
+
+def _security_event_writer():
+    """Background loop that drains the security event queue"""
+    while True:
+        _drain_security_events()
+
+threading.Thread(target=_security_event_writer, name='rados-security-log', daemon=True).start()
+atexit.register(_drain_security_events, False)
+
 def log_security_event(event_type, description, severity="INFO"):
     """Log security events with RADOS protection"""
     try:
@@ -212,20 +254,14 @@ def log_security_event(event_type, description, severity="INFO"):
             'owner': SECURITY_CONFIG['owner_identifier']
         }
         
-        # Log to file
-        log_file = f"logs/security_{datetime.utcnow().strftime('%Y%m%d')}.log"
-        os.makedirs('logs', exist_ok=True)
-        
-        with open(log_file, 'a') as f:
-            f.write(f"{json.dumps(event)}\n")
+        # Queue for the background file writer; errors are written out before returning
+        _event_queue.put(event)
+        if severity in ['ERROR', 'CRITICAL']:
+            _drain_security_events(False)
         
         # Store in memory for quick access
         SECURITY_CONFIG['security_events'].append(event)
         
-        # Keep only last 1000 events in memory
-        if len(SECURITY_CONFIG['security_events']) > 1000:
-            SECURITY_CONFIG['security_events'] = SECURITY_CONFIG['security_events'][-1000:]
-        
         # Console logging
         if severity in ['ERROR', 'CRITICAL']:
             logging.error(f"RADOS SECURITY [{severity}]: {event_type} - {description}")
@@ -380,7 +416,7 @@ def audit_system_access():
             'blocked_ips': len(SECURITY_CONFIG['blocked_ips']),
             'events_by_type': event_counts
         },
-        'recent_events': SECURITY_CONFIG['security_events'][-10:],
+        'recent_events': list(SECURITY_CONFIG['security_events'])[-10:],
         'blocked_ips': list(SECURITY_CONFIG['blocked_ips']),
         'protection_status': 'QUANTUM_ENFORCEMENT_ACTIVE'
     }
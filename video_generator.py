@@ -151,16 +151,6 @@ class VideoGenerator:
         try:
             print(f"🤖 AI enhancing scene: {scene_description}")
             
-            # Configure timeout to prevent worker timeouts
-            import signal
-            
-            def timeout_handler(signum, frame):
-                raise TimeoutError("OpenAI API call timed out")
-            
-            # Set 10 second timeout
-            signal.signal(signal.SIGALRM, timeout_handler)
-            signal.alarm(10)
-            
             try:
                 # the newest OpenAI model is "gpt-4o" which was released May 13, 2024. 
                 # do not change this unless explicitly requested by the user
@@ -184,12 +174,9 @@ class VideoGenerator:
                     timeout=8.0  # 8 second timeout
                 )
                 
-                enhanced_data = json.loads(response.choices[0].message.content)
-                signal.alarm(0)  # Cancel timeout
-                return enhanced_data
+                return json.loads(response.choices[0].message.content)
                 
-            except (TimeoutError, Exception) as api_error:
-                signal.alarm(0)  # Cancel timeout
+            except Exception as api_error:
                 logging.warning(f"OpenAI API failed: {api_error}")
                 raise api_error
             